@@ -1,312 +1,480 @@
 import streamlit as st
-import firebase_admin
-from firebase_admin import credentials, firestore, storage
-import tempfile
+import hashlib
 import datetime
-import pytz
+import instrumentation
+from instrumentation import timed
 from csv_import import csv_import_tab  # Import the CSV import tab
+from csv_export import EXPORT_FORMATS, MAX_CSV_DOWNLOAD_ROWS, export_assignments
+from photos import thumb_url, card_url
+from sms import dispatch_sheet, render_message, sheet_csv, sheet_txt
+from firebase_utils import CA_TZ
+from summaries import summary_rows
+from startup import archive_reader, assignment_feed, repository, send_queue, technician_directory, verify_page_cache
 
-# --- California Timezone ---
-CA_TZ = pytz.timezone('America/Los_Angeles')
-
-# --- Initialize Firebase with Streamlit secrets ---
-if not firebase_admin._apps:
-    firebase_creds = dict(st.secrets["firebase"])
-    cred = credentials.Certificate(firebase_creds)
-    firebase_admin.initialize_app(cred, {
-        "storageBucket": "bright-ideas-verify-technician.firebasestorage.app"
-    })
-
-db = firestore.client()
-bucket = storage.bucket()
+# --- Firebase clients and caches, built once per process (see startup.py) ---
+# every Firestore/Storage call below is counted toward this rerun
+repo = repository()  # see repository.py; all reads and writes that are not cached go through it
+technicians = technician_directory()
+assignments_cache = assignment_feed()
+verify_pages = verify_page_cache()
+archive = archive_reader()  # assignments moved to storage by archive.py
 
 # --- Helper Functions ---
+@timed("list_technicians")
 def list_technicians():
-    techs = db.collection("technicians").stream()
-    return [{"id": t.id, **t.to_dict()} for t in techs]
+    return technicians.list()
 
+@timed("list_assignments")
 def list_assignments(for_date=None, badge_id=None):
     if for_date is None:
         for_date = datetime.datetime.now(CA_TZ).strftime("%Y-%m-%d")
-    else:
-        # Ensure for_date is a string
-        for_date = str(for_date)
-    assignments = db.collection("assignments").stream()
-    out = []
-    for doc in assignments:
-        a = doc.to_dict()
-        a["_id"] = doc.id
-        sdate = str(a.get("service_date", "")).strip()
-        if not sdate:
-            continue  # skip if missing
-        if sdate != for_date:
-            continue
-        if badge_id is not None:
-            aid = str(a.get("badge_id", "")).strip()
-            bid = str(badge_id).strip()
-            if aid != bid:
-                continue
-        out.append(a)
-    return out
-
-
+    return assignments_cache.list(for_date, badge_id)
 
 def add_assignment(data):
     now_ca = datetime.datetime.now(CA_TZ)
     data["created_at"] = now_ca.isoformat()
-    data["service_date"] = now_ca.strftime("%Y-%m-%d")
-    db.collection("assignments").add(data)
+    data.setdefault("service_date", now_ca.strftime("%Y-%m-%d"))
+    doc_id = repo.add_assignment(data)
+    assignments_cache.note_write(doc_id, data)
+    verify_pages.invalidate(data["badge_id"])
 
 def verify_assignment(doc_id):
     now_ca = datetime.datetime.now(CA_TZ)
-    db.collection("assignments").document(doc_id).update({
+    update = {
         "verified": True,
         "verified_at": now_ca.isoformat()
-    })
+    }
+    repo.update_assignment(doc_id, update)
+    assignments_cache.note_write(doc_id, update)
+    verify_pages.forget_assignment(doc_id)
 
 def update_technician(badge_id, tech_data):
-    db.collection("technicians").document(badge_id).update(tech_data)
+    technicians.update(badge_id, tech_data)
 
 def update_assignment(doc_id, data):
-    db.collection("assignments").document(doc_id).update(data)
+    repo.update_assignment(doc_id, data)
+    assignments_cache.note_write(doc_id, data)
+    verify_pages.forget_assignment(doc_id)
+    if "badge_id" in data:
+        verify_pages.invalidate(data["badge_id"])  # the job may have moved to this badge
+
+def delete_assignment(doc_id):
+    repo.delete_assignment(doc_id)
+    assignments_cache.note_delete(doc_id)
+    verify_pages.forget_assignment(doc_id)
 
+@timed("export_assignments_csv")
 def export_assignments_csv():
-    import pandas as pd
-    assignments = db.collection("assignments").stream()
-    rows = [doc.to_dict() for doc in assignments]
-    if rows:
-        df = pd.DataFrame(rows)
-        csv = df.to_csv(index=False)
-        st.download_button("Download Assignments CSV", csv, "assignments.csv")
-    else:
-        st.info("No assignments to export.")
+    # Nothing is read from Firestore until someone asks for a file
+    with st.expander("Export assignments"):
+        with st.form("export_assignments"):
+            today = datetime.datetime.now(CA_TZ).date()
+            date_range = st.date_input("Service dates", value=(today - datetime.timedelta(days=30), today))
+            badge_ids = st.multiselect("Technicians (all if empty)", options=[t["badge_id"] for t in list_technicians()])
+            fmt_label = st.selectbox("Format", list(EXPORT_FORMATS))
+            build = st.form_submit_button("Build export")
+        if build:
+            start, end = date_range if len(date_range) == 2 else (date_range[0], date_range[0])
+            ext, mime = EXPORT_FORMATS[fmt_label]
+            # the download button keeps the whole file in memory and plain CSV is the largest
+            # format, so size it up with count() aggregations before any document is read
+            if ext == "csv" and repo.count_assignments(start, end, badge_ids) > MAX_CSV_DOWNLOAD_ROWS:
+                ext, mime = EXPORT_FORMATS["CSV (gzip)"]
+                st.info(f"More than {MAX_CSV_DOWNLOAD_ROWS} assignments: building gzipped CSV instead of plain CSV.")
+            try:
+                out, count = export_assignments(repo, start, end, badge_ids, ext)
+            except RuntimeError as e:
+                st.error(str(e))
+                return
+            with out:
+                data = out.read()
+            if count:
+                st.download_button(f"Download {count} assignments", data, f"assignments_{start}_{end}.{ext}", mime=mime, on_click="ignore")
+            else:
+                st.info("No assignments to export.")
+
+@timed("daily_summary")
+def daily_summary(for_date):
+    # one summary document, kept current by every assignment write (summaries.py)
+    summary = repo.load_summary(for_date)
+    with st.expander("Daily summary", expanded=True):
+        if summary is None:
+            st.info("No summary for this date yet. Rebuild it if the date already has jobs.")
+        else:
+            jobs, verified = summary.get("jobs", 0), summary.get("verified", 0)
+            cols = st.columns(3)
+            cols[0].metric("Jobs", jobs)
+            cols[1].metric("Verified", verified)
+            cols[2].metric("Verification rate", f"{verified / jobs:.0%}" if jobs else "-")
+            techs, trucks = summary_rows(summary)
+            cols = st.columns([3, 2])
+            cols[0].dataframe(techs, hide_index=True)
+            cols[1].dataframe(trucks, hide_index=True)
+        # archived days have no live assignments to count; their summary is all that is left
+        index = archive.month_index(for_date[:7])
+        archived = index is not None and for_date in index.get("dates", [])
+        if archived:
+            st.caption("Jobs on this date were archived; the summary is kept as their record.")
+        cols = st.columns(2)
+        if cols[0].button("Check counts", key="summary_check", disabled=archived):
+            jobs, verified = repo.count_day(for_date)
+            if summary is not None and (jobs, verified) == (summary.get("jobs", 0), summary.get("verified", 0)):
+                st.success("Summary matches the assignments.")
+            else:
+                st.warning(f"Assignments have {jobs} jobs, {verified} verified; rebuild the summary.")
+        if cols[1].button("Rebuild summary", key="summary_rebuild", disabled=archived):
+            repo.rebuild_summary(for_date)
+            st.rerun()
+
+@timed("dispatch_sheet")
+def dispatch_sheet_panel(for_date):
+    with st.expander("SMS dispatch sheet"):
+        queue = send_queue()
+        cols = st.columns(2)
+        build = cols[0].button("Build sheet for this date", key="sms_build")
+        send = cols[1].button("Queue all messages", key="sms_send")
+        if build or send:
+            # every message for the day in one pass over the jobs already in memory
+            rows = dispatch_sheet(list_assignments(for_date=for_date))
+            if not rows:
+                st.info("No jobs on this date.")
+            elif send:
+                queued = queue.put(rows)
+                no_phone = sum(not str(r["customer_phone"]).strip() for r in rows)
+                skipped = [f"{n} {why}" for n, why in ((no_phone, "without a customer phone"),
+                                                       (len(rows) - no_phone - queued, "already queued or sent")) if n]
+                st.success(f"Queued {queued} messages" + (f"; skipped {', '.join(skipped)}." if skipped else "."))
+            else:
+                cols = st.columns(2)
+                cols[0].download_button(f"Download CSV ({len(rows)} messages)", sheet_csv(rows), f"sms_{for_date}.csv",
+                                        mime="text/csv", on_click="ignore")
+                cols[1].download_button("Download TXT", sheet_txt(rows), f"sms_{for_date}.txt",
+                                        mime="text/plain", on_click="ignore")
+        m = queue.metrics
+        st.caption(f"Send queue ({type(queue.sender).__name__}): {m['queued']} queued, {m['sent']} sent, "
+                   f"{m['failed']} failed, {queue.pending()} waiting")
+        if queue.errors:
+            st.dataframe([{"id": i, "error": e} for i, e in queue.errors[-20:]], hide_index=True)
+
+def debug_panel(stats):
+    with st.expander("Firestore cost (debug)", expanded=True):
+        d = stats.as_dict()
+        st.write("This rerun:", d["totals"])
+        st.dataframe([{"op": op, **row} for op, row in sorted(d["ops"].items())], hide_index=True)
+        st.dataframe([{"helper": name, **t} for name, t in sorted(d["timings"].items())], hide_index=True)
+        st.write("Background (snapshot listeners) since start:", instrumentation.background.as_dict()["totals"])
+        st.write("Process totals since start:", instrumentation.process_totals.as_dict()["totals"])
+
+def cursor_pager(key, fetch, signature):
+    """Prev/next controls over a cursor-paged listing; returns the current page's rows.
+
+    `fetch(cursor)` returns (rows, cursor of the next page or None). The stack
+    of page-start cursors lives in session_state and is reset when `signature`
+    (search, sort, page size) changes.
+    """
+    pager = st.session_state.get(key)
+    if pager is None or pager["signature"] != signature:
+        pager = st.session_state[key] = {"signature": signature, "cursors": [None]}
+    rows, next_cursor = fetch(pager["cursors"][-1])
+    cols = st.columns([1, 1, 4])
+    if cols[0].button("◀ Prev", key=f"{key}_prev", disabled=len(pager["cursors"]) == 1):
+        pager["cursors"].pop()
+        st.rerun()
+    if cols[1].button("Next ▶", key=f"{key}_next", disabled=next_cursor is None):
+        pager["cursors"].append(next_cursor)
+        st.rerun()
+    cols[2].caption(f"Page {len(pager['cursors'])}")
+    return rows
+
+def list_pager(key, rows, page_size, signature):
+    """Same controls for rows already in memory."""
+    pager = st.session_state.get(key)
+    if pager is None or pager["signature"] != signature:
+        pager = st.session_state[key] = {"signature": signature, "page": 0}
+    pages = max(1, -(-len(rows) // page_size))
+    pager["page"] = min(pager["page"], pages - 1)
+    cols = st.columns([1, 1, 4])
+    if cols[0].button("◀ Prev", key=f"{key}_prev", disabled=pager["page"] == 0):
+        pager["page"] -= 1
+        st.rerun()
+    if cols[1].button("Next ▶", key=f"{key}_next", disabled=pager["page"] >= pages - 1):
+        pager["page"] += 1
+        st.rerun()
+    cols[2].caption(f"Page {pager['page'] + 1} of {pages} · {len(rows)} jobs")
+    start = pager["page"] * page_size
+    return rows[start:start + page_size]
+
+def table_key(name, ids):
+    """Widget key for a selectable table showing rows `ids`, in order.
+
+    Streamlit keeps a keyed table's selected row index across reruns; once the
+    rows change (delete, paging, search, new jobs) that index points at another
+    row. A key that changes with the rows gives the table a fresh, empty selection.
+    """
+    return f"{name}_{hashlib.sha1(chr(31).join(ids).encode('utf-8')).hexdigest()[:12]}"
+
+def selected_row(event, rows):
+    picked = event.selection.rows
+    return rows[picked[0]] if picked and picked[0] < len(rows) else None
 
 # --- Streamlit App Layout ---
 query_params = st.query_params
 view = query_params.get("view", ["admin"])[0] if isinstance(query_params.get("view", ""), list) else query_params.get("view", "admin")
+rerun_stats = instrumentation.start_rerun(view)
+
+# st.rerun() and st.stop() raise, so log the rerun on the way out
+try:
+    if view == "admin":
+        st.title("Bright Ideas Admin Panel (Firebase Version)")
+        tab1, tab2, tab3 = st.tabs(["Technician Manager", "Assign Job", "Bulk CSV Import"])
 
-if view == "admin":
-    st.title("Bright Ideas Admin Panel (Firebase Version)")
-    tab1, tab2, tab3 = st.tabs(["Technician Manager", "Assign Job", "Bulk CSV Import"])
-
-    # --- Technician Manager ---
-    with tab1:
-        st.header("Add/Edit Technician with Photo Upload")
-        edit_mode = st.session_state.get('edit_mode', False)
-        edit_badge = st.session_state.get('edit_badge', "")
-        techs = list_technicians()
-        if edit_mode and edit_badge:
-            tech = next((t for t in techs if t["badge_id"] == edit_badge), None)
-            with st.form("edit_tech"):
-                tech_name = st.text_input("Technician Name", value=tech["name"])
-                photo_file = st.file_uploader("Upload Technician Photo (optional)", type=["jpg","jpeg","png"])
-                submit_edit = st.form_submit_button("Update Technician")
-                if submit_edit:
-                    update = {"name": tech_name}
-                    if photo_file:
-                        temp_file = tempfile.NamedTemporaryFile(delete=False)
-                        temp_file.write(photo_file.read())
-                        temp_file.close()
-                        blob = bucket.blob(f"technician_photos/{edit_badge}_{photo_file.name}")
-                        with open(temp_file.name, "rb") as img_file:
-                            blob.upload_from_file(img_file)
-                        blob.make_public()
-                        photo_url = blob.public_url
-                        update["photo_url"] = photo_url
-                    update_technician(edit_badge, update)
-                    st.success(f"Technician {tech_name} updated!")
-                    st.session_state.edit_mode = False
+        # --- Technician Manager ---
+        with tab1:
+            st.header("Add/Edit Technician with Photo Upload")
+            edit_mode = st.session_state.get('edit_mode', False)
+            edit_badge = st.session_state.get('edit_badge', "")
+            if edit_mode and edit_badge:
+                tech = technicians.get(edit_badge)
+                with st.form("edit_tech"):
+                    tech_name = st.text_input("Technician Name", value=tech["name"])
+                    photo_file = st.file_uploader("Upload Technician Photo (optional)", type=["jpg","jpeg","png"])
+                    submit_edit = st.form_submit_button("Update Technician")
+                    if submit_edit:
+                        update = {"name": tech_name}
+                        if photo_file:
+                            update.update(repo.upload_photo(photo_file))
+                        update_technician(edit_badge, update)
+                        st.success(f"Technician {tech_name} updated!")
+                        st.session_state.edit_mode = False
+                        st.rerun()
+                st.button("Cancel Edit", on_click=lambda: st.session_state.update({'edit_mode': False}))
+            else:
+                with st.form("add_tech"):
+                    tech_name = st.text_input("Technician Name")
+                    badge_id = st.text_input("Badge ID")
+                    photo_file = st.file_uploader("Upload Technician Photo", type=["jpg", "jpeg", "png"])
+                    submitted = st.form_submit_button("Add Technician")
+                    if submitted:
+                        if not (tech_name and badge_id and photo_file):
+                            st.error("All fields required.")
+                        else:
+                            tech_data = {
+                                "name": tech_name,
+                                "badge_id": badge_id,
+                                **repo.upload_photo(photo_file),
+                            }
+                            technicians.set(badge_id, tech_data)
+                            st.success(f"Technician {tech_name} added with photo!")
+                            st.image(tech_data["photo_card_url"], width=200, caption="Uploaded Photo")
+                            st.write("Photo URL:", tech_data["photo_url"])
+                st.session_state.edit_mode = False
+
+            st.subheader("All Technicians in Database")
+            cols = st.columns([2, 1, 1])
+            tech_search = cols[0].text_input("Search technicians", placeholder="Starts with...")
+            tech_field = cols[1].selectbox("Search by", ["badge_id", "name"], format_func={"badge_id": "Badge ID", "name": "Name"}.get)
+            tech_page_size = cols[2].selectbox("Per page", [10, 25, 50, 100], index=1, key="tech_page_size")
+            page = cursor_pager("tech_pager",
+                                lambda cursor: repo.page_technicians(tech_field, tech_search.strip(), tech_page_size, cursor),
+                                (tech_search, tech_field, tech_page_size))
+            event = st.dataframe(
+                [{"Photo": thumb_url(d), "Name": d.get("name", ""), "Badge ID": d.get("badge_id", d["id"])} for d in page],
+                column_config={"Photo": st.column_config.ImageColumn("Photo", width="small")},
+                hide_index=True, on_select="rerun", selection_mode="single-row", key=table_key("tech_table", [d["id"] for d in page]),
+            )
+            d = selected_row(event, page)
+            if d is not None:
+                cols = st.columns(3)
+                if cols[0].button(f"Edit {d['badge_id']}"):
+                    st.session_state.edit_mode = True
+                    st.session_state.edit_badge = d['badge_id']
                     st.rerun()
-            st.button("Cancel Edit", on_click=lambda: st.session_state.update({'edit_mode': False}))
-        else:
-            with st.form("add_tech"):
-                tech_name = st.text_input("Technician Name")
-                badge_id = st.text_input("Badge ID")
-                photo_file = st.file_uploader("Upload Technician Photo", type=["jpg", "jpeg", "png"])
-                submitted = st.form_submit_button("Add Technician")
-                if submitted:
-                    if not (tech_name and badge_id and photo_file):
-                        st.error("All fields required.")
-                    else:
-                        temp_file = tempfile.NamedTemporaryFile(delete=False)
-                        temp_file.write(photo_file.read())
-                        temp_file.close()
-                        blob = bucket.blob(f"technician_photos/{badge_id}_{photo_file.name}")
-                        with open(temp_file.name, "rb") as img_file:
-                            blob.upload_from_file(img_file)
-                        blob.make_public()
-                        photo_url = blob.public_url
-                        tech_data = {
-                            "name": tech_name,
-                            "badge_id": badge_id,
-                            "photo_url": photo_url,
-                        }
-                        db.collection("technicians").document(badge_id).set(tech_data)
-                        st.success(f"Technician {tech_name} added with photo!")
-                        st.image(photo_url, width=200, caption="Uploaded Photo")
-                        st.write("Photo URL:", photo_url)
-            st.session_state.edit_mode = False
-
-        st.subheader("All Technicians in Database")
-        for d in techs:
-            st.write(f"👷 {d['name']} ({d['badge_id']})")
-            st.image(d['photo_url'], width=120)
-            cols = st.columns(3)
-            if cols[0].button(f"Edit {d['badge_id']}"):
-                st.session_state.edit_mode = True
-                st.session_state.edit_badge = d['badge_id']
-                st.rerun()
-            if cols[1].button(f"Delete {d['badge_id']}"):
-                db.collection("technicians").document(d['badge_id']).delete()
-                st.success(f"Deleted technician {d['badge_id']}")
-                st.rerun()
-            cols[2].markdown(f"[Copy Photo Link](javascript:navigator.clipboard.writeText('{d['photo_url']}'))")
-
-    # --- Assignment Tab ---
-    with tab2:
-        st.header("Assign/Edit Job to Technician")
-        # Date filter for assignments
-        selected_date = st.date_input("Show assignments for date (California time)", value=datetime.datetime.now(CA_TZ).date())
-        selected_date_str = selected_date.strftime("%Y-%m-%d")
-
-        edit_job = st.session_state.get('edit_job', False)
-        edit_job_id = st.session_state.get('edit_job_id', "")
-        techs = list_technicians()
-        if edit_job and edit_job_id:
-            assignments = list_assignments(for_date=selected_date_str)
-            a = next((x for x in assignments if x['_id'] == edit_job_id), None)
-            with st.form("edit_job_form"):
-                tech_options = [f"{t['name']} ({t['badge_id']})" for t in techs]
-                tech_idx = st.selectbox("Technician", options=range(len(tech_options)), format_func=lambda i: tech_options[i], index=next((i for i,t in enumerate(techs) if t["badge_id"]==a["badge_id"]), 0))
-                customer_name = st.text_input("Customer Name", value=a['customer_name'])
-                address = st.text_input("Address", value=a['address'])
-                project_id = st.text_input("Project ID", value=a['project_id'])
-                scheduled_time = st.time_input("Scheduled Time", datetime.datetime.strptime(a['scheduled_time'], "%H:%M").time())
-                truck_id = st.text_input("Truck ID", value=a['truck_id'])
-                submit_edit_job = st.form_submit_button("Update Assignment")
-                if submit_edit_job:
-                    tech = techs[tech_idx]
-                    update = {
-                        "badge_id": tech['badge_id'],
-                        "technician_name": tech['name'],
-                        "customer_name": customer_name,
-                        "address": address,
-                        "project_id": project_id,
-                        "scheduled_time": scheduled_time.strftime("%H:%M"),
-                        "truck_id": truck_id,
-                        "service_date": selected_date_str,  # Use selected date here
-                    }
-                    update_assignment(edit_job_id, update)
-                    st.success("Assignment updated!")
-                    st.session_state.edit_job = False
+                if cols[1].button(f"Delete {d['badge_id']}"):
+                    technicians.delete(d['badge_id'])
+                    st.success(f"Deleted technician {d['badge_id']}")
                     st.rerun()
-            st.button("Cancel Edit", on_click=lambda: st.session_state.update({'edit_job': False}))
-        else:
-            with st.form("assign_job"):
-                tech_options = [f"{t['name']} ({t['badge_id']})" for t in techs]
-                tech_idx = st.selectbox("Technician", options=range(len(tech_options)), format_func=lambda i: tech_options[i])
-                customer_name = st.text_input("Customer Name")
-                address = st.text_input("Address")
-                project_id = st.text_input("Project ID")
-                scheduled_time = st.time_input("Scheduled Time", datetime.time(9, 0))
-                truck_id = st.text_input("Truck ID")
-                submit_job = st.form_submit_button("Assign Job")
-                if submit_job:
-                    tech = techs[tech_idx]
-                    now_ca = datetime.datetime.now(CA_TZ)
-                    assignment = {
-                        "badge_id": tech['badge_id'],
-                        "technician_name": tech['name'],
-                        "customer_name": customer_name,
-                        "address": address,
-                        "project_id": project_id,
-                        "scheduled_time": scheduled_time.strftime("%H:%M"),
-                        "truck_id": truck_id,
-                        "verified": False,
-                        "created_at": now_ca.isoformat(),
-                        "service_date": selected_date_str,  # Use selected date here
-                    }
-                    add_assignment(assignment)
-                    msg = f"""Bright Ideas Construction\n📅 Service: {selected_date_str} at {scheduled_time.strftime('%I:%M %p')}\n👷 Technician: {tech['name']}\n🔧 Project #: {project_id}\n🏠 Address: {address}\n🚚 Truck: {truck_id}\n✅ Verify: https://energybicverification.streamlit.app/?view=verify&badge_id={tech['badge_id']}\n"""
-                    st.success("Assignment added!")
-                    st.info("Auto Text Message:\n" + msg)
-            st.session_state.edit_job = False
-
-        st.subheader("Assignments for selected date")
-        for a in list_assignments(for_date=selected_date_str):
-            st.write(f"{a['scheduled_time']} | {a['technician_name']} | {a['customer_name']} | {a['address']} | {a['project_id']}")
-            cols = st.columns(3)
-            if cols[0].button(f"Edit job {a['_id']}"):
-                st.session_state.edit_job = True
-                st.session_state.edit_job_id = a['_id']
-                st.rerun()
-            if cols[1].button(f"Delete job {a['_id']}"):
-                db.collection("assignments").document(a['_id']).delete()
-                st.success(f"Deleted assignment {a['_id']}")
-                st.rerun()
-            sms_text = f"Bright Ideas Construction\nService: {selected_date_str} at {a['scheduled_time']}\nTechnician: {a['technician_name']}\nProject #: {a['project_id']}\nAddress: {a['address']}\nTruck: {a['truck_id']}\nVerify: https://energybicverification.streamlit.app/?view=verify&badge_id={a['badge_id']}\n"
-            if cols[2].button(f"Copy SMS {a['_id']}"):
-                st.code(sms_text, language='text')
-
-        export_assignments_csv()
-
-    # --- Bulk CSV Import Tab ---
-    with tab3:
-        csv_import_tab(db)
-
-elif view == "verify":
-    st.title("Customer: Verify Your Technician")
-    badge_id = query_params.get("badge_id", [""])[0]
-    if not badge_id:
-        badge_id = st.text_input("Enter Technician Badge ID to verify jobs for selected date")
-    if badge_id:
-        selected_date = st.date_input("Select date (California time)", value=datetime.datetime.now(CA_TZ).date())
-        selected_date_str = selected_date.strftime("%Y-%m-%d")
-        jobs = list_assignments(for_date=selected_date_str, badge_id=badge_id)
-        tech = next((t for t in list_technicians() if t['badge_id'] == badge_id), None)
-        if tech:
-            st.markdown(
-                f"""
-                <div style="display: flex; align-items: center; background: #f8f9fa; border-radius: 12px; padding: 18px; margin-bottom: 20px; box-shadow: 0 2px 6px rgba(0,0,0,0.07);">
-                  <img src="{tech['photo_url']}" width="95" style="border-radius: 16px; margin-right: 24px; border: 2px solid #eee;">
-                  <div>
-                    <h3 style="margin-bottom: 5px;">Technician: {tech['name']}</h3>
-                    <div style="color: #777;">Badge ID: <b>{badge_id}</b></div>
-                  </div>
-                </div>
-                """,
-                unsafe_allow_html=True,
+                cols[2].markdown(f"[Copy Photo Link](javascript:navigator.clipboard.writeText('{d.get('photo_url', '')}'))")
+
+        # --- Assignment Tab ---
+        with tab2:
+            st.header("Assign/Edit Job to Technician")
+            # Date filter for assignments
+            selected_date = st.date_input("Show assignments for date (California time)", value=datetime.datetime.now(CA_TZ).date())
+            selected_date_str = selected_date.strftime("%Y-%m-%d")
+
+            edit_job = st.session_state.get('edit_job', False)
+            edit_job_id = st.session_state.get('edit_job_id', "")
+            techs = list_technicians()
+            if edit_job and edit_job_id:
+                assignments = list_assignments(for_date=selected_date_str)
+                a = next((x for x in assignments if x['_id'] == edit_job_id), None)
+                with st.form("edit_job_form"):
+                    tech_options = [f"{t['name']} ({t['badge_id']})" for t in techs]
+                    tech_idx = st.selectbox("Technician", options=range(len(tech_options)), format_func=lambda i: tech_options[i], index=next((i for i,t in enumerate(techs) if t["badge_id"]==a["badge_id"]), 0))
+                    customer_name = st.text_input("Customer Name", value=a['customer_name'])
+                    customer_phone = st.text_input("Customer Phone", value=a.get('customer_phone', ''))
+                    address = st.text_input("Address", value=a['address'])
+                    project_id = st.text_input("Project ID", value=a['project_id'])
+                    scheduled_time = st.time_input("Scheduled Time", datetime.datetime.strptime(a['scheduled_time'], "%H:%M").time())
+                    truck_id = st.text_input("Truck ID", value=a['truck_id'])
+                    submit_edit_job = st.form_submit_button("Update Assignment")
+                    if submit_edit_job:
+                        tech = techs[tech_idx]
+                        update = {
+                            "badge_id": tech['badge_id'],
+                            "technician_name": tech['name'],
+                            "customer_name": customer_name,
+                            "customer_phone": customer_phone,
+                            "address": address,
+                            "project_id": project_id,
+                            "scheduled_time": scheduled_time.strftime("%H:%M"),
+                            "truck_id": truck_id,
+                            "service_date": selected_date_str,  # Use selected date here
+                        }
+                        update_assignment(edit_job_id, update)
+                        st.success("Assignment updated!")
+                        st.session_state.edit_job = False
+                        st.rerun()
+                st.button("Cancel Edit", on_click=lambda: st.session_state.update({'edit_job': False}))
+            else:
+                with st.form("assign_job"):
+                    tech_options = [f"{t['name']} ({t['badge_id']})" for t in techs]
+                    tech_idx = st.selectbox("Technician", options=range(len(tech_options)), format_func=lambda i: tech_options[i])
+                    customer_name = st.text_input("Customer Name")
+                    customer_phone = st.text_input("Customer Phone")
+                    address = st.text_input("Address")
+                    project_id = st.text_input("Project ID")
+                    scheduled_time = st.time_input("Scheduled Time", datetime.time(9, 0))
+                    truck_id = st.text_input("Truck ID")
+                    submit_job = st.form_submit_button("Assign Job")
+                    if submit_job:
+                        tech = techs[tech_idx]
+                        now_ca = datetime.datetime.now(CA_TZ)
+                        assignment = {
+                            "badge_id": tech['badge_id'],
+                            "technician_name": tech['name'],
+                            "customer_name": customer_name,
+                            "customer_phone": customer_phone,
+                            "address": address,
+                            "project_id": project_id,
+                            "scheduled_time": scheduled_time.strftime("%H:%M"),
+                            "truck_id": truck_id,
+                            "verified": False,
+                            "created_at": now_ca.isoformat(),
+                            "service_date": selected_date_str,  # Use selected date here
+                        }
+                        add_assignment(assignment)
+                        msg = render_message(assignment)
+                        st.success("Assignment added!")
+                        st.info("Auto Text Message:\n" + msg)
+                st.session_state.edit_job = False
+
+            daily_summary(selected_date_str)
+
+            st.subheader("Assignments for selected date")
+            # the day's jobs are already in memory (AssignmentFeed), so search and paging cost no reads
+            cols = st.columns([3, 1])
+            job_search = cols[0].text_input("Search jobs", placeholder="Technician, badge or project")
+            job_page_size = cols[1].selectbox("Per page", [10, 25, 50, 100], index=1, key="job_page_size")
+            jobs = sorted(list_assignments(for_date=selected_date_str), key=lambda a: a.get("scheduled_time", ""))
+            needle = job_search.strip().lower()
+            if needle:
+                jobs = [a for a in jobs if any(needle in str(a.get(f, "")).lower() for f in ("technician_name", "badge_id", "project_id"))]
+            page = list_pager("job_pager", jobs, job_page_size, (selected_date_str, job_search, job_page_size))
+            event = st.dataframe(
+                [{"Time": a.get("scheduled_time", ""), "Technician": a.get("technician_name", ""), "Customer": a.get("customer_name", ""),
+                  "Address": a.get("address", ""), "Project #": a.get("project_id", ""), "Truck": a.get("truck_id", ""),
+                  "Verified": bool(a.get("verified"))} for a in page],
+                hide_index=True, on_select="rerun", selection_mode="single-row", key=table_key("job_table", [a["_id"] for a in page]),
             )
+            a = selected_row(event, page)
+            if a is not None:
+                cols = st.columns(3)
+                if cols[0].button(f"Edit job {a['_id']}"):
+                    st.session_state.edit_job = True
+                    st.session_state.edit_job_id = a['_id']
+                    st.rerun()
+                if cols[1].button(f"Delete job {a['_id']}"):
+                    delete_assignment(a['_id'])
+                    st.success(f"Deleted assignment {a['_id']}")
+                    st.rerun()
+                if cols[2].button(f"Copy SMS {a['_id']}"):
+                    st.code(render_message(a), language='text')
 
-        if not jobs:
-            st.warning("No jobs found for this technician on the selected date.")
-        else:
-            st.markdown("### Your Scheduled Service")
-            for idx, job in enumerate(jobs):
-                with st.container():
-                    st.markdown(
-                        f"""
-                        <div style="background: #e9f8ef; border-radius: 10px; padding: 18px 22px; margin-bottom: 18px; box-shadow: 0 2px 8px rgba(0,0,0,0.06);">
-                          <div><b>Customer:</b> {job['customer_name']}</div>
-                          <div><b>Address:</b> {job['address']}</div>
-                          <div><b>Project #:</b> {job['project_id']}</div>
-                          <div><b>Scheduled Time:</b> {job['scheduled_time']}</div>
-                          <div><b>Truck:</b> {job['truck_id']}</div>
-                        </div>
-                        """,
-                        unsafe_allow_html=True,
-                    )
-                    colA, colB = st.columns([2,1])
-                    with colA:
-                        if st.button(f"✅ I Verified (Job {idx+1})"):
-                            verify_assignment(job['_id'])
-                            st.success("Thank you for verifying your technician!")
-                            st.rerun()
-                    with colB:
-                        with st.expander("Show full details"):
-                            st.json(job)
-            st.caption("If you have multiple scheduled jobs, verify each one separately.")
-    st.caption("For best experience, view on mobile or desktop.")
-
-else:
-    st.error("Unknown view. Use ?view=admin or ?view=verify in the URL.")
+            dispatch_sheet_panel(selected_date_str)
+            export_assignments_csv()
+
+        # --- Bulk CSV Import Tab ---
+        with tab3:
+            csv_import_tab(repo, technicians)
+
+        if query_params.get("debug"):
+            debug_panel(rerun_stats)
+
+    elif view == "verify":
+        st.title("Customer: Verify Your Technician")
+        badge_id = query_params.get("badge_id", "")
+        if isinstance(badge_id, list):
+            badge_id = badge_id[0] if badge_id else ""
+        if not badge_id:
+            badge_id = st.text_input("Enter Technician Badge ID to verify jobs for selected date")
+        if badge_id:
+            selected_date = st.date_input("Select date (California time)", value=datetime.datetime.now(CA_TZ).date())
+            selected_date_str = selected_date.strftime("%Y-%m-%d")
+            # technician get and jobs query run concurrently, cached briefly per (badge, date)
+            tech, jobs = verify_pages.get(badge_id, selected_date_str)
+            archived = False
+            if not jobs and selected_date < datetime.datetime.now(CA_TZ).date():
+                # past jobs may have been moved to the archive; shown read-only
+                jobs = archive.find(selected_date_str, badge_id)
+                archived = bool(jobs)
+            if tech:
+                st.markdown(
+                    f"""
+                    <div style="display: flex; align-items: center; background: #f8f9fa; border-radius: 12px; padding: 18px; margin-bottom: 20px; box-shadow: 0 2px 6px rgba(0,0,0,0.07);">
+                      <img src="{card_url(tech)}" width="95" style="border-radius: 16px; margin-right: 24px; border: 2px solid #eee;">
+                      <div>
+                        <h3 style="margin-bottom: 5px;">Technician: {tech['name']}</h3>
+                        <div style="color: #777;">Badge ID: <b>{badge_id}</b></div>
+                      </div>
+                    </div>
+                    """,
+                    unsafe_allow_html=True,
+                )
+
+            if not jobs:
+                st.warning("No jobs found for this technician on the selected date.")
+            else:
+                st.markdown("### Your Scheduled Service")
+                for idx, job in enumerate(jobs):
+                    with st.container():
+                        st.markdown(
+                            f"""
+                            <div style="background: #e9f8ef; border-radius: 10px; padding: 18px 22px; margin-bottom: 18px; box-shadow: 0 2px 8px rgba(0,0,0,0.06);">
+                              <div><b>Customer:</b> {job['customer_name']}</div>
+                              <div><b>Address:</b> {job['address']}</div>
+                              <div><b>Project #:</b> {job['project_id']}</div>
+                              <div><b>Scheduled Time:</b> {job['scheduled_time']}</div>
+                              <div><b>Truck:</b> {job['truck_id']}</div>
+                            </div>
+                            """,
+                            unsafe_allow_html=True,
+                        )
+                        colA, colB = st.columns([2,1])
+                        with colA:
+                            if archived:
+                                st.caption("Archived job: " + ("verified" if job.get("verified") else "not verified"))
+                            elif st.button(f"✅ I Verified (Job {idx+1})"):
+                                verify_assignment(job['_id'])
+                                st.success("Thank you for verifying your technician!")
+                                st.rerun()
+                        with colB:
+                            with st.expander("Show full details"):
+                                st.json(job)
+                st.caption("If you have multiple scheduled jobs, verify each one separately.")
+        st.caption("For best experience, view on mobile or desktop.")
+
+    else:
+        st.error("Unknown view. Use ?view=admin or ?view=verify in the URL.")
+finally:
+    instrumentation.finish_rerun(rerun_stats)
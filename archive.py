@@ -0,0 +1,228 @@
+import re
+import gzip
+import json
+import time
+import datetime
+import threading
+from collections import OrderedDict
+from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath
+from firebase_utils import BATCH_SIZE, CA_TZ, batched, normalize_service_date
+
+# --- Cold storage for past assignments ---
+# Assignments whose service_date is older than the retention window are moved
+# out of the `assignments` collection into one gzipped NDJSON blob per month,
+#   archive/assignments/YYYY-MM.ndjson.gz
+# with a small archive_index/{YYYY-MM} document listing the month's row count,
+# badge IDs and service dates, so a lookup only downloads a month that has the
+# job. Daily summaries are left alone: they keep describing archived days.
+
+ARCHIVE_PREFIX = "archive/assignments"
+INDEX = "archive_index"
+DEFAULT_DAYS = 90
+PAGE_SIZE = 500
+DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def blob_name(month):
+    return f"{ARCHIVE_PREFIX}/{month}.ndjson.gz"
+
+
+def read_month(bucket, month):
+    """The archived rows of `month` as {doc_id: row}; empty if nothing is archived yet."""
+    blob = bucket.blob(blob_name(month))
+    if not blob.exists():
+        return {}
+    rows = {}
+    for line in gzip.decompress(blob.download_as_bytes()).splitlines():
+        if line:
+            row = json.loads(line)
+            rows[row["id"]] = row
+    return rows
+
+
+def write_month(bucket, month, rows):
+    ordered = sorted(rows.values(), key=lambda r: (r.get("service_date", ""), r.get("scheduled_time", ""), r["id"]))
+    data = gzip.compress("".join(json.dumps(r, default=str) + "\n" for r in ordered).encode("utf-8"))
+    bucket.blob(blob_name(month)).upload_from_string(data, content_type="application/gzip")
+
+
+def is_archived(db, service_date):
+    """Whether jobs on `service_date` ('YYYY-MM-DD') were moved to the archive."""
+    snap = db.collection(INDEX).document(service_date[:7]).get()
+    return snap.exists and service_date in snap.to_dict().get("dates", [])
+
+
+def archive_assignments(db, bucket, days=DEFAULT_DAYS, dry_run=False, today=None, page_size=PAGE_SIZE):
+    """Move assignments with a service_date more than `days` days before today
+    into the monthly archive. Returns {month: rows moved}.
+
+    Only YYYY-MM-DD service dates are archived; blank or malformed ones stay
+    in `assignments`. Each month is merged into its existing blob by document
+    ID, uploaded, and indexed before its documents are deleted, so an
+    interrupted run loses nothing and running it again finishes the job.
+    """
+    today = today or datetime.datetime.now(CA_TZ).date()
+    cutoff = (today - datetime.timedelta(days=days)).isoformat()
+    # the lower bound keeps blank service dates ("" sorts before every date) out of the archive
+    q = (db.collection("assignments").where(filter=FieldFilter("service_date", ">=", "0000"))
+         .where(filter=FieldFilter("service_date", "<", cutoff))
+         .order_by("service_date").order_by(FieldPath.document_id()).limit(page_size))
+    moved = {}
+    month, pending = None, []
+    last = None
+    while True:
+        page = list((q.start_after(last) if last is not None else q).stream())
+        for doc in page:
+            if not DATE_RE.fullmatch(str(doc.get("service_date"))):
+                continue
+            doc_month = str(doc.get("service_date"))[:7]
+            if doc_month != month:
+                if pending:
+                    moved[month] = _archive_month(db, bucket, month, pending, dry_run)
+                month, pending = doc_month, []
+            pending.append(doc)
+        if len(page) < page_size:
+            break
+        last = page[-1]
+    if pending:
+        moved[month] = _archive_month(db, bucket, month, pending, dry_run)
+    return moved
+
+
+def _archive_month(db, bucket, month, docs, dry_run):
+    if dry_run:
+        return len(docs)
+    rows = read_month(bucket, month)
+    for doc in docs:
+        rows[doc.id] = {"id": doc.id, **doc.to_dict()}
+    write_month(bucket, month, rows)
+    db.collection(INDEX).document(month).set({
+        "month": month,
+        "blob": blob_name(month),
+        "count": len(rows),
+        "badge_ids": sorted({str(r.get("badge_id", "")) for r in rows.values()}),
+        "dates": sorted({str(r.get("service_date", "")) for r in rows.values()}),
+        "archived_at": datetime.datetime.now(CA_TZ).isoformat(),
+    })
+    col = db.collection("assignments")
+    for chunk in batched(docs, BATCH_SIZE):
+        batch = db.batch()
+        for doc in chunk:
+            batch.delete(col.document(doc.id))
+        batch.commit()
+    return len(docs)
+
+
+class ArchiveReader:
+    """On-demand access to archived assignments for the verify view and exports.
+
+    Index documents are cached for `ttl` seconds and the last `max_months`
+    decoded months are kept in memory, keyed by their archived_at stamp, so
+    repeated lookups in the same month download nothing. `bucket` is a
+    callable, so the storage client is only built when a month is read.
+    """
+
+    def __init__(self, db, bucket, ttl=300, max_months=4):
+        self.db = db
+        self._bucket = bucket
+        self.ttl = ttl
+        self.max_months = max_months
+        self._lock = threading.Lock()
+        self._index = {}  # month -> (loaded_at, index doc or None)
+        self._months = OrderedDict()  # (month, archived_at) -> rows
+
+    def month_index(self, month):
+        with self._lock:
+            hit = self._index.get(month)
+        if hit is not None and time.monotonic() - hit[0] < self.ttl:
+            return hit[1]
+        snap = self.db.collection(INDEX).document(month).get()
+        index = snap.to_dict() if snap.exists else None
+        with self._lock:
+            self._index[month] = (time.monotonic(), index)
+        return index
+
+    def _rows(self, index):
+        key = (index["month"], index.get("archived_at"))
+        with self._lock:
+            rows = self._months.get(key)
+            if rows is not None:
+                self._months.move_to_end(key)
+                return rows
+        rows = sorted(read_month(self._bucket(), index["month"]).values(),
+                      key=lambda r: (r.get("service_date", ""), r.get("scheduled_time", ""), r["id"]))
+        with self._lock:
+            self._months[key] = rows
+            while len(self._months) > self.max_months:
+                self._months.popitem(last=False)
+        return rows
+
+    def find(self, for_date, badge_id=None):
+        """Archived jobs on `for_date` (for one badge if given), sorted by time, with `_id` set."""
+        for_date = normalize_service_date(for_date)
+        index = self.month_index(for_date[:7])
+        if index is None or for_date not in index.get("dates", []):
+            return []
+        if badge_id is not None:
+            badge_id = str(badge_id).strip()
+            if badge_id not in index.get("badge_ids", []):
+                return []
+        return [{**r, "_id": r["id"]} for r in self._rows(index)
+                if r.get("service_date") == for_date and (badge_id is None or r.get("badge_id") == badge_id)]
+
+    def iter_range(self, start_date, end_date, badge_ids=None):
+        """Yield archived rows with service dates in [start_date, end_date], oldest month first."""
+        start, end = normalize_service_date(start_date), normalize_service_date(end_date)
+        wanted = {str(b).strip() for b in badge_ids} if badge_ids else None
+        for index in self._indexes(start, end, wanted):
+            for r in self._rows(index):
+                if start <= r.get("service_date", "") <= end and (wanted is None or r.get("badge_id") in wanted):
+                    yield r
+
+    def count_range(self, start_date, end_date, badge_ids=None):
+        """Upper bound on the rows iter_range() yields: the row counts of the
+        months it would read, from their index documents only."""
+        start, end = normalize_service_date(start_date), normalize_service_date(end_date)
+        wanted = {str(b).strip() for b in badge_ids} if badge_ids else None
+        return sum(index.get("count", 0) for index in self._indexes(start, end, wanted))
+
+    def _indexes(self, start, end, wanted):
+        # index documents of the months with a date in [start, end] and one of the wanted badges
+        q = (self.db.collection(INDEX).where(filter=FieldFilter("month", ">=", start[:7]))
+             .where(filter=FieldFilter("month", "<=", end[:7])))
+        for snap in q.stream():
+            index = snap.to_dict()
+            if not any(start <= d <= end for d in index.get("dates", [])):
+                continue
+            if wanted is not None and wanted.isdisjoint(index.get("badge_ids", [])):
+                continue
+            yield index
+
+    def invalidate(self):
+        with self._lock:
+            self._index = {}
+            self._months.clear()
+
+
+if __name__ == "__main__":
+    import argparse
+    from firebase_utils import cli_bucket, cli_client
+    parser = argparse.ArgumentParser(description="Move old assignments to the storage archive")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("run", help="archive assignments older than --days")
+    p.add_argument("--days", type=int, default=DEFAULT_DAYS)
+    p.add_argument("--dry-run", action="store_true")
+    p = sub.add_parser("find", help="print archived jobs for a date as NDJSON")
+    p.add_argument("date")
+    p.add_argument("--badge")
+    args = parser.parse_args()
+    db = cli_client()
+    if args.command == "run":
+        moved = archive_assignments(db, cli_bucket(), days=args.days, dry_run=args.dry_run)
+        for month, n in moved.items():
+            print(f"{month}: {n} assignments {'to archive' if args.dry_run else 'archived'}")
+        print(f"{sum(moved.values())} assignments in {len(moved)} month(s)")
+    elif args.command == "find":
+        for row in ArchiveReader(db, cli_bucket).find(args.date, args.badge):
+            print(json.dumps(row, default=str))
@@ -0,0 +1,617 @@
+"""Benchmarks against the Firestore emulator.
+
+    firebase emulators:start --only firestore
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python bench.py queries --sizes 1000 10000 100000
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python bench.py import --rows 2000
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python bench.py export --size 100000
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python bench.py listener --reruns 50
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python bench.py verify --users 200
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python bench.py startup
+    FIRESTORE_EMULATOR_HOST=localhost:8080 STORAGE_EMULATOR_HOST=http://localhost:9199 python bench.py archive
+        (needs the storage emulator too: firebase emulators:start --only firestore,storage)
+    python bench.py validate --rows 100000     (no emulator needed)
+    python bench.py suite --fleets 100:10000 1000:100000 10000:1000000 --save baseline.json   (in memory)
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python bench.py suite --backend firestore --baseline baseline.json
+    python bench.py stats before.jsonl after.jsonl   (compare FIRESTORE_STATS_LOG files)
+
+Every run wipes the emulator database (and the archive blobs), so never point this at production.
+"""
+import os
+import sys
+import time
+import random
+import json
+import argparse
+import datetime
+import resource
+import statistics
+import subprocess
+import urllib.request
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from firebase_utils import AssignmentFeed, TechnicianDirectory, VerifyPageCache, cli_bucket, cli_client, query_assignments
+from archive import ARCHIVE_PREFIX, ArchiveReader, archive_assignments
+from csv_import import import_rows, validate_frame
+from csv_export import export_assignments
+from repository import BATCH_SIZE, FirestoreRepository, MemoryRepository
+
+BASE_DATE = datetime.date(2025, 1, 1)
+
+
+# --- Emulator helpers ---
+def require_emulator():
+    host = os.environ.get("FIRESTORE_EMULATOR_HOST")
+    if not host:
+        sys.exit("Set FIRESTORE_EMULATOR_HOST (e.g. localhost:8080); benchmarks wipe the database.")
+    return host
+
+
+def clear_emulator(db):
+    host = require_emulator()
+    url = f"http://{host}/emulator/v1/projects/{db.project}/databases/(default)/documents"
+    urllib.request.urlopen(urllib.request.Request(url, method="DELETE")).read()
+
+
+def commit_in_batches(db, items, batch_size=500):
+    """Write (ref, data) pairs with batched sets."""
+    batch = db.batch()
+    pending = 0
+    for ref, data in items:
+        batch.set(ref, data)
+        pending += 1
+        if pending >= batch_size:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+
+
+def fake_assignment(rng, techs, days, start=BASE_DATE):
+    badge = f"T{rng.randrange(techs):04d}"
+    day = start + datetime.timedelta(days=rng.randrange(days))
+    return {
+        "badge_id": badge,
+        "technician_name": f"Tech {badge}",
+        "customer_name": f"Customer {rng.randrange(100000)}",
+        "address": f"{rng.randrange(1, 9999)} Main St",
+        "project_id": f"P{rng.randrange(100000)}",
+        "scheduled_time": f"{rng.randrange(7, 18):02d}:{rng.choice(['00', '30'])}",
+        "truck_id": f"TK{rng.randrange(40)}",
+        "verified": False,
+        "created_at": datetime.datetime.combine(day, datetime.time(7)).isoformat(),
+        "service_date": day.isoformat(),
+    }
+
+
+def seed_assignments(db, n, techs=50, days=365, seed=0, start=BASE_DATE):
+    rng = random.Random(seed)
+    col = db.collection("assignments")
+    commit_in_batches(db, ((col.document(), fake_assignment(rng, techs, days, start)) for _ in range(n)))
+
+
+def median_time(fn, repeats):
+    times = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+# --- queries: full scan vs server-side filters ---
+def legacy_list_assignments(db, for_date, badge_id=None):
+    """The pre-index implementation: stream everything, filter in Python."""
+    out = []
+    reads = 0
+    for doc in db.collection("assignments").stream():
+        reads += 1
+        a = doc.to_dict()
+        if str(a.get("service_date", "")).strip() != for_date:
+            continue
+        if badge_id is not None and str(a.get("badge_id", "")).strip() != badge_id:
+            continue
+        out.append(a)
+    return out, reads
+
+
+def bench_queries(args):
+    db = cli_client()
+    day = (BASE_DATE + datetime.timedelta(days=100)).isoformat()
+    badge = "T0007"
+    print(f"{'size':>8} {'case':<16} {'path':<7} {'docs read':>10} {'median ms':>10}")
+    for size in args.sizes:
+        clear_emulator(db)
+        seed_assignments(db, size)
+        cases = [("date", {}), ("date+badge", {"badge_id": badge})]
+        for name, kw in cases:
+            repeats = 1 if size >= 100000 else args.repeats
+            t, (rows, reads) = median_time(lambda: legacy_list_assignments(db, day, **kw), repeats)
+            print(f"{size:>8} {name:<16} {'scan':<7} {reads:>10} {t * 1000:>10.1f}")
+            t, rows = median_time(lambda: query_assignments(db, for_date=day, **kw), args.repeats)
+            # Firestore bills one read per returned document, minimum one per query
+            print(f"{size:>8} {name:<16} {'query':<7} {max(len(rows), 1):>10} {t * 1000:>10.1f}")
+        t, rows = median_time(lambda: query_assignments(db, badge_id=badge, start_date=day, end_date=BASE_DATE + datetime.timedelta(days=130)), args.repeats)
+        print(f"{size:>8} {'30d range+badge':<16} {'query':<7} {max(len(rows), 1):>10} {t * 1000:>10.1f}")
+
+
+# --- import: per-row round trips vs prefetch + batched writes ---
+def fake_import_frame(rows, techs, seed=0):
+    import pandas as pd
+    rng = random.Random(seed)
+    records = []
+    for _ in range(rows):
+        a = fake_assignment(rng, techs, 1)
+        records.append({
+            "Technician Name": a["technician_name"],
+            "Badge ID": a["badge_id"],
+            "Project ID": a["project_id"],
+            "Customer Name": a["customer_name"],
+            "Address": a["address"],
+            "Scheduled Time": a["scheduled_time"],
+            "Truck ID": a["truck_id"],
+        })
+    return pd.DataFrame(records)
+
+
+def legacy_import_rows(db, df):
+    """The original csv_import_tab loop: get, set/update and add for every row."""
+    added_techs, updated_techs, assignments_added = 0, 0, 0
+    for badge, row in zip(df["Badge ID"].astype(str).str.strip(), df.to_dict("records")):
+        tech_ref = db.collection("technicians").document(badge)
+        tech_data = {"name": row["Technician Name"], "badge_id": badge}
+        prev = tech_ref.get()
+        if prev.exists:
+            if prev.to_dict()["name"] != tech_data["name"]:
+                tech_ref.update(tech_data)
+                updated_techs += 1
+        else:
+            tech_ref.set(tech_data)
+            added_techs += 1
+        db.collection("assignments").add({
+            "badge_id": badge,
+            "technician_name": row["Technician Name"],
+            "customer_name": row["Customer Name"],
+            "address": row["Address"],
+            "project_id": row["Project ID"],
+            "scheduled_time": str(row["Scheduled Time"]),
+            "created_at": datetime.datetime.now().isoformat(),
+            "truck_id": row["Truck ID"],
+            "verified": False,
+        })
+        assignments_added += 1
+    return added_techs, updated_techs, assignments_added
+
+
+def bench_import(args):
+    db = cli_client()
+    df = fake_import_frame(args.rows, args.techs)
+    print(f"{'path':<8} {'rows':>7} {'seconds':>9} {'rows/s':>9}  counts (added, updated, assignments)")
+    def batched(db, df):
+        clean, report = validate_frame(df, BASE_DATE)
+        return import_rows(FirestoreRepository(db), clean)
+
+    for name, fn in [("per-row", legacy_import_rows), ("batched", batched)]:
+        clear_emulator(db)
+        start = time.perf_counter()
+        counts = fn(db, df)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<8} {len(df):>7} {elapsed:>9.2f} {len(df) / elapsed:>9.0f}  {counts}")
+
+
+# --- export: in-memory DataFrame vs paged streaming ---
+def legacy_export(db, start, end):
+    """The original export_assignments_csv body (it ignored any date range)."""
+    import pandas as pd
+    rows = [doc.to_dict() for doc in db.collection("assignments").stream()]
+    return len(pd.DataFrame(rows).to_csv(index=False))
+
+
+def streaming_export(db, start, end, fmt="csv"):
+    out, count = export_assignments(FirestoreRepository(db, archive=ArchiveReader(db, cli_bucket)), start, end, fmt=fmt)
+    with out:
+        return out.seek(0, os.SEEK_END)
+
+
+def _export_child(name, fmt, queue):
+    db = cli_client()
+    start, end = BASE_DATE, BASE_DATE + datetime.timedelta(days=365)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t = time.perf_counter()
+    size = legacy_export(db, start, end) if name == "dataframe" else streaming_export(db, start, end, fmt)
+    elapsed = time.perf_counter() - t
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((elapsed, before, after, size))
+
+
+def bench_export(args):
+    db = cli_client()
+    clear_emulator(db)
+    seed_assignments(db, args.size)
+    # each path runs in a fresh process so peak RSS isn't shared between them
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{'path':<10} {'format':<7} {'seconds':>8} {'peak RSS MB':>12} {'growth MB':>10} {'bytes':>12}")
+    for name, fmt in [("dataframe", "csv"), ("streaming", "csv"), ("streaming", "csv.gz"), ("streaming", "parquet")]:
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_export_child, args=(name, fmt, queue))
+        proc.start()
+        elapsed, before, after, size = queue.get()
+        proc.join()
+        # ru_maxrss is in KiB on Linux
+        print(f"{name:<10} {fmt:<7} {elapsed:>8.2f} {after / 1024:>12.1f} {(after - before) / 1024:>10.1f} {size:>12}")
+
+
+# --- listener: per-rerun queries vs snapshot-listener cache ---
+def bench_listener(args):
+    db = cli_client()
+    clear_emulator(db)
+    seed_assignments(db, args.size, days=30)
+    day = (BASE_DATE + datetime.timedelta(days=3)).isoformat()
+    ids = [doc.id for doc in query_assignments(db, for_date=day)]
+    rng = random.Random(1)
+
+    def rerun(list_fn):
+        # an admin rerun lists the day twice (list + edit form), a customer once by badge
+        list_fn(day)
+        list_fn(day)
+        list_fn(day, "T0007")
+
+    def edit():
+        db.collection("assignments").document(rng.choice(ids)).update({"verified": True})
+
+    query_reads = 0
+    start = time.perf_counter()
+    for i in range(args.reruns):
+        if i % args.edit_every == 0:
+            edit()
+        for_date_calls = []
+        rerun(lambda d, b=None: for_date_calls.append(query_assignments(db, for_date=d, badge_id=b)))
+        query_reads += sum(max(len(rows), 1) for rows in for_date_calls)
+    query_time = time.perf_counter() - start
+
+    feed = AssignmentFeed(db)
+    start = time.perf_counter()
+    for i in range(args.reruns):
+        if i % args.edit_every == 0:
+            edit()
+        rerun(feed.list)
+    feed_time = time.perf_counter() - start
+    feed_reads = feed.metrics["listener_reads"] + feed.metrics["fallback_reads"]
+    feed.close()
+
+    print(f"{len(ids)} assignments on {day}, {args.reruns} reruns, an edit every {args.edit_every}")
+    print(f"{'path':<9} {'reads/rerun':>12} {'ms/rerun':>9}")
+    print(f"{'query':<9} {query_reads / args.reruns:>12.1f} {query_time * 1000 / args.reruns:>9.1f}")
+    print(f"{'listener':<9} {feed_reads / args.reruns:>12.1f} {feed_time * 1000 / args.reruns:>9.1f}")
+    print(f"listener metrics: {feed.metrics}")
+
+
+# --- verify: customer burst load test ---
+def legacy_verify_page(db, badge_id, for_date):
+    """The original verify view: a full assignments scan, then a full technicians scan."""
+    jobs = [doc.to_dict() for doc in db.collection("assignments").stream()
+            if doc.get("service_date") == for_date and doc.get("badge_id") == badge_id]
+    techs = [t.to_dict() for t in db.collection("technicians").stream()]
+    return next((t for t in techs if t.get("badge_id") == badge_id), None), jobs
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def bench_verify(args):
+    db = cli_client()
+    clear_emulator(db)
+    seed_assignments(db, args.size, techs=args.techs, days=30)
+    tech_col = db.collection("technicians")
+    commit_in_batches(db, ((tech_col.document(f"T{i:04d}"), {"name": f"Tech T{i:04d}", "badge_id": f"T{i:04d}", "photo_url": ""})
+                           for i in range(args.techs)))
+    day = (BASE_DATE + datetime.timedelta(days=3)).isoformat()
+    rng = random.Random(2)
+    # a morning SMS batch: every customer of the day opens their technician's link
+    badges = [rng.choice([f"T{i:04d}" for i in range(args.techs)]) for _ in range(args.users)]
+
+    cache = VerifyPageCache(db, TechnicianDirectory(FirestoreRepository(db)))
+    paths = [("cached", lambda b: cache.get(b, day)), ("uncached", lambda b: legacy_verify_page(db, b, day))]
+    print(f"{args.users} page loads, {args.concurrency} concurrent, {args.size} assignments")
+    print(f"{'path':<9} {'p50 ms':>8} {'p99 ms':>8} {'total s':>8}")
+    for name, load in paths:
+        if name == "uncached" and args.skip_uncached:
+            continue
+
+        def timed_load(badge):
+            start = time.perf_counter()
+            load(badge)
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            latencies = list(pool.map(timed_load, badges))
+        total = time.perf_counter() - start
+        print(f"{name:<9} {percentile(latencies, 50) * 1000:>8.1f} {percentile(latencies, 99) * 1000:>8.1f} {total:>8.2f}")
+
+
+# --- archive: hot-path latency as history grows ---
+def bench_archive(args):
+    if not os.environ.get("STORAGE_EMULATOR_HOST"):
+        sys.exit("Set STORAGE_EMULATOR_HOST (e.g. http://localhost:9199); this benchmark wipes the archive blobs.")
+    db = cli_client()
+    bucket = cli_bucket()
+    if not bucket.exists():
+        bucket.create()
+    hot_start = BASE_DATE + datetime.timedelta(days=args.history_days)
+    today = hot_start + datetime.timedelta(days=args.days)
+    day = (today - datetime.timedelta(days=1)).isoformat()
+    week = (today - datetime.timedelta(days=7)).isoformat()
+    old_day = (BASE_DATE + datetime.timedelta(days=10)).isoformat()
+    badge = "T0007"
+
+    def hot_paths():
+        return [median_time(fn, args.repeats)[0] * 1000 for fn in (
+            lambda: query_assignments(db, for_date=day),                   # list_assignments / feed fallback
+            lambda: query_assignments(db, for_date=day, badge_id=badge),   # verify page
+            lambda: streaming_export(db, week, day),                       # last week's export
+        )]
+
+    print(f"{args.hot} live assignments over the last {args.days} days; history older than that")
+    print(f"{'history':>8} {'state':<9} {'live docs':>10} {'day ms':>8} {'verify ms':>10} {'7d export ms':>13} {'archive s':>10} {'cold find ms':>13}")
+    for size in args.sizes:
+        clear_emulator(db)
+        for blob in bucket.list_blobs(prefix=ARCHIVE_PREFIX):
+            blob.delete()
+        seed_assignments(db, size, techs=args.techs, days=args.history_days)
+        seed_assignments(db, args.hot, techs=args.techs, days=args.days, seed=1, start=hot_start)
+        live = db.collection("assignments").count().get()[0][0].value
+        day_ms, verify_ms, export_ms = hot_paths()
+        print(f"{size:>8} {'live':<9} {live:>10} {day_ms:>8.1f} {verify_ms:>10.1f} {export_ms:>13.1f} {'-':>10} {'-':>13}")
+
+        start = time.perf_counter()
+        archive_assignments(db, bucket, days=args.days, today=today)
+        archive_s = time.perf_counter() - start
+        live = db.collection("assignments").count().get()[0][0].value
+        day_ms, verify_ms, export_ms = hot_paths()
+        start = time.perf_counter()
+        ArchiveReader(db, lambda: bucket).find(old_day, badge)  # first lookup downloads the month
+        find_ms = (time.perf_counter() - start) * 1000
+        print(f"{size:>8} {'archived':<9} {live:>10} {day_ms:>8.1f} {verify_ms:>10.1f} {export_ms:>13.1f} {archive_s:>10.1f} {find_ms:>13.1f}")
+
+
+# --- startup: cold import time and time to first render ---
+HEAVY_MODULES = ["pandas", "pyarrow", "google.cloud.storage", "PIL.Image"]
+
+
+def bench_startup(args):
+    db = cli_client()
+    clear_emulator(db)
+    seed_assignments(db, 500, days=7)
+    app = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+    # runs in a fresh interpreter: import the app's modules, then render `view` once
+    probe = (
+        "import sys, time, json\n"
+        "t0 = time.perf_counter()\n"
+        "import streamlit, firebase_utils, instrumentation, startup, csv_import, csv_export, photos\n"
+        "t_import = time.perf_counter() - t0\n"
+        "from streamlit.testing.v1 import AppTest\n"
+        "at = AppTest.from_file(sys.argv[1], default_timeout=60)\n"
+        "at.query_params['view'] = sys.argv[2]\n"
+        "if sys.argv[2] == 'verify': at.query_params['badge_id'] = 'T0001'\n"
+        "t1 = time.perf_counter()\n"
+        "at.run()\n"
+        "t_render = time.perf_counter() - t1\n"
+        "print(json.dumps({'import': t_import, 'render': t_render, 'errors': [str(e.value) for e in at.exception],\n"
+        "                  'loaded': [m for m in sys.argv[3:] if m in sys.modules]}))\n"
+    )
+    print(f"{'view':<7} {'import s':>9} {'1st render s':>13} {'process s':>10}  heavy modules loaded")
+    for view in ("admin", "verify"):
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            out = subprocess.run([sys.executable, "-c", probe, app, view] + HEAVY_MODULES,
+                                 capture_output=True, text=True, check=True, cwd=os.path.dirname(app))
+            wall = time.perf_counter() - start
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            if r["errors"]:
+                print(f"{view}: {r['errors']}")
+            print(f"{view:<7} {r['import']:>9.3f} {r['render']:>13.3f} {wall:>10.3f}  {', '.join(r['loaded']) or '-'}")
+
+
+# --- validate: vectorized CSV validation ---
+def bench_validate(args):
+    df = fake_import_frame(args.rows, args.techs)
+    t, (clean, report) = median_time(lambda: validate_frame(df, BASE_DATE), args.repeats)
+    print(f"{len(df)} rows validated in {t * 1000:.0f} ms (median of {args.repeats}), {len(clean)} clean, {len(report)} report lines")
+
+
+# --- suite: end-to-end regression baseline over the repository API ---
+def make_repository(backend):
+    if backend == "memory":
+        return MemoryRepository()
+    db = cli_client()
+    clear_emulator(db)
+    # the app's setup (startup.repository): exports also look in the archive
+    return FirestoreRepository(db, archive=ArchiveReader(db, cli_bucket))
+
+
+def seed_fleet(repo, techs, assignments, days, seed=0):
+    """Write `techs` technicians and `assignments` jobs spread over `days` days."""
+    repo.write_technicians({f"T{i:04d}": {"name": f"Tech T{i:04d}", "badge_id": f"T{i:04d}", "photo_url": ""}
+                            for i in range(techs)}, {})
+    rng = random.Random(seed)
+    for start in range(0, assignments, BATCH_SIZE):
+        repo.write_assignments([(f"A{i:07d}", "insert", fake_assignment(rng, techs, days))
+                                for i in range(start, min(start + BATCH_SIZE, assignments))])
+
+
+def run_suite(repo, techs, args):
+    """Time the app's hot paths; returns [(metric, value, unit)]."""
+    day = (BASE_DATE + datetime.timedelta(days=args.days // 2)).isoformat()
+    rng = random.Random(3)
+    results = []
+
+    t, jobs = median_time(lambda: repo.list_assignments(for_date=day), args.repeats)
+    results.append(("list day", t * 1000, "ms"))
+
+    badges = [f"T{rng.randrange(techs):04d}" for _ in range(args.lookups)]
+    latencies = []
+    for badge in badges:
+        start = time.perf_counter()
+        repo.get_technician(badge)
+        repo.list_assignments(for_date=day, badge_id=badge)
+        latencies.append(time.perf_counter() - start)
+    results.append(("verify p50", percentile(latencies, 50) * 1000, "ms"))
+    results.append(("verify p99", percentile(latencies, 99) * 1000, "ms"))
+
+    ids = [a["_id"] for a in rng.sample(jobs, min(args.updates, len(jobs)))]
+    start = time.perf_counter()
+    for doc_id in ids:
+        repo.update_assignment(doc_id, {"verified": True})
+    results.append(("update", (time.perf_counter() - start) * 1000 / max(len(ids), 1), "ms/op"))
+
+    end = BASE_DATE + datetime.timedelta(days=args.days // 2 + 29)
+    start = time.perf_counter()
+    out, rows = export_assignments(repo, day, end)  # what the admin page's Build export runs
+    out.close()
+    results.append(("export 30d", rows / max(time.perf_counter() - start, 1e-9), "rows/s"))
+
+    clean, report = validate_frame(fake_import_frame(args.import_rows, techs, seed=4), BASE_DATE)
+    start = time.perf_counter()
+    import_rows(repo, clean)
+    results.append(("import", len(clean) / (time.perf_counter() - start), "rows/s"))
+    return results
+
+
+def bench_suite(args):
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {(r["backend"], r["techs"], r["assignments"], r["metric"]): r["value"] for r in json.load(f)}
+    records = []
+    print(f"{'backend':<9} {'techs':>6} {'assignments':>11} {'metric':<11} {'value':>12} {'unit':<7} {'vs baseline':>11}")
+    for techs, assignments in args.fleets:
+        repo = make_repository(args.backend)
+        start = time.perf_counter()
+        seed_fleet(repo, techs, assignments, args.days)
+        print(f"{args.backend:<9} {techs:>6} {assignments:>11} {'seed':<11} {time.perf_counter() - start:>12.2f} {'s':<7}")
+        for metric, value, unit in run_suite(repo, techs, args):
+            key = (args.backend, techs, assignments, metric)
+            change = f"{(value - baseline[key]) / baseline[key] * 100:+.0f}%" if baseline.get(key) else ""
+            print(f"{args.backend:<9} {techs:>6} {assignments:>11} {metric:<11} {value:>12.2f} {unit:<7} {change:>11}")
+            records.append({"backend": args.backend, "techs": techs, "assignments": assignments,
+                            "metric": metric, "value": value, "unit": unit})
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(records, f, indent=1)
+
+
+def fleet(text):
+    techs, assignments = text.split(":")
+    return int(techs), int(assignments)
+
+
+# --- stats: compare per-rerun cost logs from two commits ---
+def summarize_stats_log(path):
+    """Mean totals and helper seconds per rerun label from a FIRESTORE_STATS_LOG file."""
+    groups = {}
+    with open(path) as f:
+        for line in f:
+            rec = json.loads(line)
+            g = groups.setdefault(rec["label"], {"reruns": 0, "totals": {}, "timings": {}})
+            g["reruns"] += 1
+            for k, v in rec["totals"].items():
+                g["totals"][k] = g["totals"].get(k, 0) + v
+            for k, t in rec["timings"].items():
+                g["timings"][k] = g["timings"].get(k, 0) + t["seconds"]
+    for g in groups.values():
+        n = g["reruns"]
+        g["totals"] = {k: v / n for k, v in g["totals"].items()}
+        g["timings"] = {k: v / n for k, v in g["timings"].items()}
+    return groups
+
+
+def bench_stats(args):
+    before, after = summarize_stats_log(args.before), summarize_stats_log(args.after)
+    print(f"{'label':<8} {'metric':<32} {'before':>12} {'after':>12} {'change':>8}")
+    for label in sorted(set(before) | set(after)):
+        b, a = before.get(label), after.get(label)
+        metrics = {}
+        for side, g in (("b", b), ("a", a)):
+            if g is None:
+                continue
+            for k, v in g["totals"].items():
+                metrics.setdefault(k, {})[side] = v
+            for k, v in g["timings"].items():
+                metrics.setdefault(f"{k} (s)", {})[side] = v
+        for name, vals in sorted(metrics.items()):
+            bv, av = vals.get("b", 0), vals.get("a", 0)
+            change = f"{(av - bv) / bv * 100:+.0f}%" if bv else "n/a"
+            print(f"{label:<8} {name:<32} {bv:>12.4g} {av:>12.4g} {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.set_defaults(emulator=True)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("queries", help="full-collection scan vs indexed assignment queries")
+    p.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    p.add_argument("--repeats", type=int, default=5)
+    p.set_defaults(func=bench_queries)
+    p = sub.add_parser("import", help="per-row CSV import vs prefetched batched import")
+    p.add_argument("--rows", type=int, default=2000)
+    p.add_argument("--techs", type=int, default=50)
+    p.set_defaults(func=bench_import)
+    p = sub.add_parser("export", help="peak RSS and time of full-history exports")
+    p.add_argument("--size", type=int, default=100000)
+    p.set_defaults(func=bench_export)
+    p = sub.add_parser("listener", help="reads per rerun with and without the snapshot-listener cache")
+    p.add_argument("--size", type=int, default=10000)
+    p.add_argument("--reruns", type=int, default=50)
+    p.add_argument("--edit-every", type=int, default=10)
+    p.set_defaults(func=bench_listener)
+    p = sub.add_parser("verify", help="p50/p99 verify page data latency under concurrent customers")
+    p.add_argument("--size", type=int, default=10000)
+    p.add_argument("--techs", type=int, default=50)
+    p.add_argument("--users", type=int, default=200)
+    p.add_argument("--concurrency", type=int, default=50)
+    p.add_argument("--skip-uncached", action="store_true", help="skip the slow full-scan baseline")
+    p.set_defaults(func=bench_verify)
+    p = sub.add_parser("archive", help="hot-path latency before and after archiving growing history")
+    p.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 200000], help="history rows")
+    p.add_argument("--hot", type=int, default=3000, help="rows in the live window")
+    p.add_argument("--days", type=int, default=30, help="live window in days")
+    p.add_argument("--history-days", type=int, default=730)
+    p.add_argument("--techs", type=int, default=50)
+    p.add_argument("--repeats", type=int, default=5)
+    p.set_defaults(func=bench_archive)
+    p = sub.add_parser("startup", help="cold import and first-render time for ?view=admin and ?view=verify")
+    p.add_argument("--repeats", type=int, default=3)
+    p.set_defaults(func=bench_startup)
+    p = sub.add_parser("validate", help="time the vectorized CSV validation stage")
+    p.add_argument("--rows", type=int, default=100000)
+    p.add_argument("--techs", type=int, default=500)
+    p.add_argument("--repeats", type=int, default=5)
+    p.set_defaults(func=bench_validate, emulator=False)
+    p = sub.add_parser("suite", help="list/verify/update/export/import timings for synthetic fleets")
+    p.add_argument("--backend", choices=["memory", "firestore"], default="memory")
+    p.add_argument("--fleets", type=fleet, nargs="+", default=[fleet("100:10000"), fleet("1000:100000")],
+                   metavar="TECHS:ASSIGNMENTS", help="up to 10000:1000000; the memory backend needs ~1.2 GB for 1M")
+    p.add_argument("--days", type=int, default=365)
+    p.add_argument("--lookups", type=int, default=200)
+    p.add_argument("--updates", type=int, default=50)
+    p.add_argument("--import-rows", type=int, default=2000)
+    p.add_argument("--repeats", type=int, default=5)
+    p.add_argument("--save", help="write results as JSON, to use as a later --baseline")
+    p.add_argument("--baseline", help="JSON from an earlier --save to compare against")
+    p.set_defaults(func=bench_suite, emulator=False)
+    p = sub.add_parser("stats", help="compare mean per-rerun cost between two FIRESTORE_STATS_LOG files")
+    p.add_argument("before")
+    p.add_argument("after")
+    p.set_defaults(func=bench_stats, emulator=False)
+    args = parser.parse_args()
+    if args.emulator:
+        require_emulator()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import io
+import csv
+import gzip
+import tempfile
+from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath
+from firebase_utils import assignments_query
+
+PAGE_SIZE = 500
+MAX_IN_FILTER = 30  # Firestore limit on values in an "in" filter
+# st.download_button needs the whole file in memory; past this many rows the
+# admin page builds gzipped CSV instead of plain CSV
+MAX_CSV_DOWNLOAD_ROWS = 100000
+
+# Stable column order so exports from different ranges line up
+EXPORT_COLUMNS = [
+    "id",
+    "service_date",
+    "scheduled_time",
+    "badge_id",
+    "technician_name",
+    "customer_name",
+    "customer_phone",
+    "address",
+    "project_id",
+    "truck_id",
+    "verified",
+    "verified_at",
+    "created_at",
+]
+
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "CSV (gzip)": ("csv.gz", "application/gzip"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+
+def iter_assignment_pages(db, start_date, end_date, badge_ids=None, page_size=PAGE_SIZE, archive=None):
+    """Yield lists of export rows for service dates in [start_date, end_date].
+
+    Pages are fetched with query cursors, so only one page of documents is held
+    in memory at a time. Up to 30 badge IDs are filtered by Firestore; larger
+    selections are filtered as the pages arrive. With an archive.ArchiveReader,
+    archived months in the range come first, one month in memory at a time.
+    """
+    archived = set()
+    if archive is not None:
+        rows = []
+        for a in archive.iter_range(start_date, end_date, badge_ids):
+            archived.add(a["id"])
+            rows.append({col: a.get(col) for col in EXPORT_COLUMNS})
+            if len(rows) >= page_size:
+                yield rows
+                rows = []
+        if rows:
+            yield rows
+    q = assignments_query(db, start_date=start_date, end_date=end_date)
+    wanted = None
+    if badge_ids:
+        badge_ids = [str(b).strip() for b in badge_ids]
+        if len(badge_ids) <= MAX_IN_FILTER:
+            q = q.where(filter=FieldFilter("badge_id", "in", badge_ids))
+        else:
+            wanted = set(badge_ids)
+    q = q.order_by("service_date").order_by(FieldPath.document_id()).limit(page_size)
+    last = None
+    while True:
+        page = list((q.start_after(last) if last is not None else q).stream())
+        if not page:
+            return
+        rows = []
+        for doc in page:
+            a = doc.to_dict()
+            if wanted is not None and a.get("badge_id") not in wanted:
+                continue
+            if doc.id in archived:
+                continue  # archived by a run that stopped before deleting it
+            a["id"] = doc.id
+            rows.append({col: a.get(col) for col in EXPORT_COLUMNS})
+        if rows:
+            yield rows
+        if len(page) < page_size:
+            return
+        last = page[-1]
+
+
+def count_assignments(db, start_date, end_date, badge_ids=None, archive=None):
+    """Upper bound on the rows iter_assignment_pages() yields for the same
+    arguments, without reading any assignment document: count() aggregations
+    (one read per 1,000 index entries) plus the archive's month row counts."""
+    q = assignments_query(db, start_date=start_date, end_date=end_date)
+    if badge_ids:
+        badge_ids = list(dict.fromkeys(str(b).strip() for b in badge_ids))
+        queries = [q.where(filter=FieldFilter("badge_id", "in", badge_ids[i:i + MAX_IN_FILTER]))
+                   for i in range(0, len(badge_ids), MAX_IN_FILTER)]
+    else:
+        queries = [q]
+    count = sum(c.count().get()[0][0].value for c in queries)
+    if archive is not None:
+        count += archive.count_range(start_date, end_date, badge_ids)
+    return count
+
+
+def write_export(pages, fileobj, fmt="csv"):
+    """Write row pages from iter_assignment_pages to binary `fileobj`. Returns the row count."""
+    if fmt == "parquet":
+        return _write_parquet(pages, fileobj)
+    raw = gzip.GzipFile(fileobj=fileobj, mode="wb") if fmt == "csv.gz" else fileobj
+    text = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+    writer = csv.DictWriter(text, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    count = 0
+    for rows in pages:
+        writer.writerows(rows)
+        count += len(rows)
+    text.flush()
+    text.detach()  # leave fileobj open for the caller
+    if raw is not fileobj:
+        raw.close()
+    return count
+
+
+def _write_parquet(pages, fileobj):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+    schema = pa.schema([(col, pa.bool_() if col == "verified" else pa.string()) for col in EXPORT_COLUMNS])
+    count = 0
+    with pq.ParquetWriter(fileobj, schema) as writer:
+        for rows in pages:
+            columns = {col: [r[col] if col == "verified" or r[col] is None else str(r[col]) for r in rows] for col in EXPORT_COLUMNS}
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            count += len(rows)
+    return count
+
+
+def export_assignments(repo, start_date, end_date, badge_ids=None, fmt="csv"):
+    """Export to a temporary file on disk and return (file rewound to 0, row count).
+
+    Rows are streamed page by page into the file, so building it keeps memory
+    bounded by the page size however long the date range is. Serving it is a
+    separate matter: st.download_button holds the whole finished file in
+    memory, so large ranges should use the csv.gz or parquet formats; check
+    with repo.count_assignments() before reading anything.
+    """
+    out = tempfile.TemporaryFile()
+    count = write_export(repo.iter_assignment_pages(start_date, end_date, badge_ids), out, fmt)
+    out.seek(0)
+    return out, count
@@ -1,96 +1,319 @@
 import streamlit as st
+import time
+import hashlib
 import datetime
+from google.cloud.firestore_v1 import DELETE_FIELD
+from firebase_utils import BATCH_SIZE, CA_TZ, batched
+from photos import VARIANT_FIELDS
+from instrumentation import timed
+from summaries import summary_delta
 
-def csv_import_tab(db):
+CHUNK_ROWS = BATCH_SIZE  # rows per checkpointed chunk: one batch, plus the checkpoint and summary writes
+
+# CSV header -> assignment/technician field
+COLUMNS = {
+    "Technician Name": "technician_name",
+    "Badge ID": "badge_id",
+    "Photo URL": "photo_url",
+    "Project ID": "project_id",
+    "Customer Name": "customer_name",
+    "Customer Phone": "customer_phone",
+    "Address": "address",
+    "Scheduled Time": "scheduled_time",
+    "Truck ID": "truck_id",
+}
+OPTIONAL_COLUMNS = ["Photo URL", "Customer Phone"]
+REQUIRED_COLUMNS = [c for c in COLUMNS if c not in OPTIONAL_COLUMNS]
+# assignment fields taken from the CSV; compared to decide insert/update/no-op
+ASSIGNMENT_FIELDS = ["badge_id", "technician_name", "customer_name", "address", "project_id",
+                     "scheduled_time", "truck_id", "service_date"]
+# "YYYY-MM-DD HH:MM" once a bare "HH:MM" has the default date prepended; seconds are dropped
+_SCHEDULED_RE = r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(?::\d{2})?"
+
+
+@timed("validate_frame")
+def validate_frame(df, default_date):
+    """Validate and normalize a raw CSV frame with column operations only.
+
+    Returns (clean, report). `clean` keeps the valid, non-duplicate rows renamed
+    to their Firestore field names, with `service_date` ('YYYY-MM-DD', from the
+    Scheduled Time or `default_date`), `scheduled_time` ('HH:MM') and a
+    CA_TZ-localized `scheduled_at`. `report` has one line per problem with the
+    CSV row number (header is row 1), column, severity and message; any
+    "error" line means the file should not be imported.
+    """
+    import pandas as pd
+    report = []
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    for col in missing:
+        report.append(pd.DataFrame({"row": [None], "column": [col], "severity": ["error"], "message": ["Missing column"]}))
+    for col in df.columns:
+        if col not in COLUMNS:
+            report.append(pd.DataFrame({"row": [None], "column": [col], "severity": ["warning"], "message": ["Unknown column, ignored"]}))
+    if missing:
+        return pd.DataFrame(columns=list(COLUMNS.values()) + ["service_date", "scheduled_at"]), _report_frame(report)
+
+    present = [c for c in COLUMNS if c in df.columns]
+    clean = pd.DataFrame({COLUMNS[c]: df[c].fillna("").astype(str).str.strip() for c in present}, index=df.index)
+    for c in OPTIONAL_COLUMNS:
+        if COLUMNS[c] not in clean:
+            clean[COLUMNS[c]] = ""
+    row_no = pd.Series(df.index + 2, index=df.index)
+
+    def flag(mask, column, severity, message):
+        if mask.any():
+            msgs = message if isinstance(message, pd.Series) else pd.Series(message, index=df.index)
+            report.append(pd.DataFrame({"row": row_no[mask], "column": column, "severity": severity, "message": msgs[mask]}))
+
+    flag(clean["badge_id"] == "", "Badge ID", "error", "Missing Badge ID")
+
+    sched = clean["scheduled_time"]
+    has_date = sched.str.len() > 8
+    full = sched.where(has_date, pd.Timestamp(default_date).strftime("%Y-%m-%d ") + sched)
+    well_formed = full.str.fullmatch(_SCHEDULED_RE)
+    scheduled_at = pd.to_datetime(full.where(well_formed), format="ISO8601", errors="coerce")
+    flag(scheduled_at.isna(), "Scheduled Time", "error", "Invalid time '" + sched + "'")
+    clean["service_date"] = full.str.slice(0, 10)
+    clean["scheduled_time"] = full.str.slice(11, 16)
+    # 02:00-02:59 on the day DST starts never happens; reject it rather than move it, so
+    # scheduled_at and scheduled_time always agree
+    clean["scheduled_at"] = scheduled_at.dt.tz_localize(CA_TZ, ambiguous=False, nonexistent="NaT")
+    nonexistent = scheduled_at.notna() & clean["scheduled_at"].isna()
+    flag(nonexistent, "Scheduled Time", "error", "Time '" + sched + "' does not exist: clocks skip ahead an hour when DST starts")
+    # 01:00-01:59 on the day DST ends happens twice; read it as standard time and say so
+    ambiguous = (scheduled_at.notna() & ~nonexistent
+                 & scheduled_at.dt.tz_localize(CA_TZ, ambiguous="NaT", nonexistent="NaT").isna())
+    flag(ambiguous, "Scheduled Time", "warning", "Time '" + sched + "' occurs twice when DST ends; read as standard time (PST)")
+
+    # one 64-bit hash per row is much cheaper than factorizing every column
+    row_hash = pd.util.hash_pandas_object(clean[[COLUMNS[c] for c in REQUIRED_COLUMNS]], index=False)
+    dupes = row_hash.duplicated(keep="first")
+    if dupes.any():
+        first = row_no.groupby(row_hash).transform("first")
+        flag(dupes, "", "warning", "Duplicate of row " + first.astype(str) + ", skipped")
+
+    bad = clean["badge_id"].eq("") | clean["scheduled_at"].isna() | dupes
+    return clean[~bad], _report_frame(report)
+
+
+def _report_frame(parts):
+    import pandas as pd
+    if not parts:
+        return pd.DataFrame(columns=["row", "column", "severity", "message"])
+    report = pd.concat(parts, ignore_index=True)
+    return report.sort_values("row", na_position="first", kind="stable").reset_index(drop=True)
+
+
+def assignment_id(badge_id, project_id, service_date, scheduled_time):
+    """Deterministic document ID, so importing the same job again updates it instead of duplicating it."""
+    key = "|".join(str(v).strip() for v in (badge_id, project_id, service_date, scheduled_time))
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+
+
+def import_key(clean):
+    """Checkpoint document ID for a validate_frame() frame; the same file always gets the same key."""
+    import pandas as pd
+    hashes = pd.util.hash_pandas_object(clean[ASSIGNMENT_FIELDS + [COLUMNS[c] for c in OPTIONAL_COLUMNS]], index=False)
+    return hashlib.sha256(hashes.to_numpy().tobytes()).hexdigest()[:32]
+
+
+@timed("plan_import")
+def plan_import(repo, df, done_chunks=()):
+    """Work out every write importing a validate_frame() frame would make, without writing.
+
+    Technicians referenced by the frame are fetched up front in one call and
+    the rows replayed against them in order, so a badge that appears twice with
+    a changed name counts as one add and one update. Assignments get
+    deterministic IDs and are grouped into CHUNK_ROWS-row chunks; the existing
+    documents of every chunk not in `done_chunks` are fetched and each row is
+    classified as an insert, an update (changed fields only, so verification
+    state survives) or a no-op. The planned state of each document carries
+    over between chunks, so a key repeated in a later chunk updates the row
+    an earlier chunk inserts rather than inserting it twice. Finished chunks
+    are None in plan["chunks"]. plan["summaries"] holds each chunk's daily
+    summary changes, worked out from the same before/after documents.
+    """
+    badges = df["badge_id"]
+    current = repo.get_technicians(dict.fromkeys(badges))
+
+    added_techs, updated_techs = 0, 0
+    created, changed = {}, {}  # badge_id -> data to set / fields to update
+    rows = df.to_dict("records")
+    for badge, row in zip(badges, rows):
+        tech_data = {
+            "name": row["technician_name"],
+            "badge_id": badge,
+        }
+        if row["photo_url"]:
+            tech_data["photo_url"] = row["photo_url"]
+        prev_data = current.get(badge)
+        if prev_data is None:
+            current[badge] = created[badge] = tech_data
+            added_techs += 1
+        elif prev_data["name"] != tech_data["name"] or (tech_data.get("photo_url") and prev_data.get("photo_url") != tech_data.get("photo_url")):
+            prev_data.update(tech_data)
+            if badge not in created:
+                fields = changed.setdefault(badge, {})
+                fields.update(tech_data)
+                if "photo_url" in tech_data:
+                    # thumbnails of the previous photo no longer apply
+                    fields.update({f: DELETE_FIELD for f in VARIANT_FIELDS})
+            updated_techs += 1
+
+    now = datetime.datetime.now(CA_TZ).isoformat()
+    counts = {"insert": 0, "update": 0, "noop": 0}
+    chunks, summaries = [], []
+    planned = {}  # doc_id -> document as it will be after the chunks planned so far
+    for i, chunk_rows in enumerate(batched(rows, CHUNK_ROWS)):
+        if i in done_chunks:
+            chunks.append(None)
+            summaries.append(None)
+            continue
+        ids = [assignment_id(r["badge_id"], r["project_id"], r["service_date"], r["scheduled_time"]) for r in chunk_rows]
+        planned.update(repo.get_assignments([doc_id for doc_id in dict.fromkeys(ids) if doc_id not in planned]))
+        ops, deltas = [], {}
+        for doc_id, row in zip(ids, chunk_rows):
+            data = {f: row[f] for f in ASSIGNMENT_FIELDS}
+            if row["customer_phone"]:
+                # like Photo URL, a blank phone leaves the stored one alone
+                data["customer_phone"] = row["customer_phone"]
+            prev = planned.get(doc_id)
+            if prev is None:
+                action, payload = "insert", {**data, "created_at": now, "verified": False}
+            else:
+                payload = {f: v for f, v in data.items() if prev.get(f) != v}
+                action = "update" if payload else "noop"
+            # a later row with the same key sees this one's result
+            planned[doc_id] = {**(prev or {}), **payload}
+            if action != "noop":
+                summary_delta(prev, planned[doc_id], deltas)
+            counts[action] += 1
+            ops.append((doc_id, action, payload))
+        chunks.append(ops)
+        summaries.append(deltas)
+    return {
+        "tech_sets": created,
+        "tech_updates": changed,
+        "added_techs": added_techs,
+        "updated_techs": updated_techs,
+        "chunks": chunks,
+        "summaries": summaries,
+        "counts": counts,
+    }
+
+
+@timed("apply_import")
+def apply_import(repo, plan, key=None, on_progress=None):
+    """Commit a plan_import() plan to a repository. Technician writes go
+    first, then one atomic write_assignments() call per chunk, which also
+    carries the chunk's daily summary increments; with a checkpoint `key` each
+    call also records its chunk as done, so a retried import resumes after it
+    and never counts a chunk twice."""
+    repo.write_technicians(plan["tech_sets"], plan["tech_updates"])
+    total = len(plan["chunks"])
+    rows_left = sum(len(ops) for ops in plan["chunks"] if ops is not None)
+    rows_done = 0
+    for i, ops in enumerate(plan["chunks"]):
+        if ops is None:
+            continue
+        writes = [op for op in ops if op[1] != "noop"]
+        if writes or key:
+            repo.write_assignments(writes, plan["summaries"][i], checkpoint=(key, i, total) if key else None)
+        rows_done += len(ops)
+        if on_progress is not None:
+            on_progress(rows_done, rows_left)
+
+
+def import_rows(repo, df, on_progress=None):
+    """Plan and apply an import in one go without a checkpoint.
+
+    Returns (added_techs, updated_techs, assignments_inserted).
+    """
+    plan = plan_import(repo, df)
+    apply_import(repo, plan, on_progress=on_progress)
+    return plan["added_techs"], plan["updated_techs"], plan["counts"]["insert"]
+
+
+def plan_table(plan, limit=500):
+    """The first `limit` planned assignment changes as rows for st.dataframe."""
+    out = []
+    for i, ops in enumerate(plan["chunks"]):
+        for doc_id, action, payload in ops or ():
+            if action != "noop":
+                out.append({"chunk": i, "action": action, "doc_id": doc_id,
+                            "changes": ", ".join(f"{k}={v}" for k, v in payload.items() if k not in ("created_at", "verified"))})
+                if len(out) >= limit:
+                    return out
+    return out
+
+
+def csv_import_tab(repo, technicians=None):
     st.header("\U0001F4E5 Bulk Import Technicians & Assignments (CSV)")
     st.write("""
     **Instructions:**  
-    - CSV must have columns: `Technician Name`, `Badge ID`, `Photo URL` (optional), `Project ID`, `Customer Name`, `Address`, `Scheduled Time`, `Truck ID`
+    - CSV must have columns: `Technician Name`, `Badge ID`, `Photo URL` (optional), `Project ID`, `Customer Name`, `Customer Phone` (optional), `Address`, `Scheduled Time`, `Truck ID`
     - If a technician already exists by badge ID, info will be updated if changed.
-    - Assignments will always be added.
+    - `Scheduled Time` may be `HH:MM` or `YYYY-MM-DD HH:MM`; rows without a date use the service date chosen below.
+    - Each job is identified by badge ID, project ID, service date and time: importing it again updates it instead of adding a duplicate, and an interrupted import resumes where it stopped.
+    - Exact duplicate rows are skipped.
     """)
     csv_file = st.file_uploader("Upload CSV file", type=["csv"])
 
     if csv_file:
         import pandas as pd
         try:
-            df = pd.read_csv(csv_file)
+            df = pd.read_csv(csv_file, dtype=str)
             st.subheader("Preview")
             st.dataframe(df.head(10))
 
-            # Validate columns
-            required_cols = ["Technician Name", "Badge ID", "Project ID", "Customer Name", "Address", "Scheduled Time", "Truck ID"]
-            missing = [col for col in required_cols if col not in df.columns]
-            if missing:
-                st.error(f"Missing columns: {missing}")
-            else:
-                # Show errors/warnings for missing badge id or time format
-                errors = []
-                for idx, row in df.iterrows():
-                    if not str(row["Badge ID"]).strip():
-                        errors.append(f"Row {idx+2}: Missing Badge ID")
-                    try:
-                        # Accepts both HH:MM or YYYY-MM-DD HH:MM
-                        datetime.time.fromisoformat(str(row["Scheduled Time"])) if len(str(row["Scheduled Time"])) <= 5 else datetime.datetime.fromisoformat(str(row["Scheduled Time"]))
-                    except Exception:
-                        errors.append(f"Row {idx+2}: Invalid time '{row['Scheduled Time']}'")
-                if errors:
-                    st.error("CSV validation errors found:")
-                    st.write("\n".join(errors))
+            default_date = st.date_input("Service date for rows without one (California time)", value=datetime.datetime.now(CA_TZ).date())
+            clean, report = validate_frame(df, default_date)
+            errors = report[report["severity"] == "error"]
+            if len(report):
+                if len(errors):
+                    st.error(f"CSV validation found {len(errors)} error(s); fix them and upload again.")
                 else:
-                    if st.button("Bulk Import Now"):
-                        added_techs, updated_techs, assignments_added = 0, 0, 0
-                        for _, row in df.iterrows():
-                            # Add/update technician
-                            tech_ref = db.collection("technicians").document(str(row["Badge ID"]))
-                            tech_data = {
-                                "name": row["Technician Name"],
-                                "badge_id": row["Badge ID"],
-                            }
-                            # Optional photo
-                            if "Photo URL" in df.columns and pd.notnull(row["Photo URL"]):
-                                tech_data["photo_url"] = row["Photo URL"]
-                            prev = tech_ref.get()
-                            if prev.exists:
-                                prev_data = prev.to_dict()
-                                if prev_data["name"] != tech_data["name"] or (tech_data.get("photo_url") and prev_data.get("photo_url") != tech_data.get("photo_url")):
-                                    tech_ref.update(tech_data)
-                                    updated_techs += 1
-                            else:
-                                tech_ref.set(tech_data)
-                                added_techs += 1
-
-                            # Add assignment
-                            # Accept both "HH:MM" or full datetime
-                            sched = str(row["Scheduled Time"])
-                            if len(sched) <= 5:
-                                now = datetime.datetime.now()
-                                sched_dt = f"{now.date()} {sched}"
-                            else:
-                                sched_dt = sched
-                            assignment = {
-                                "badge_id": row["Badge ID"],
-                                "technician_name": row["Technician Name"],
-                                "customer_name": row["Customer Name"],
-                                "address": row["Address"],
-                                "project_id": row["Project ID"],
-                                "scheduled_time": sched,
-                                "created_at": datetime.datetime.now().isoformat(),
-                                "truck_id": row["Truck ID"],
-                                "verified": False,
-                            }
-                            db.collection("assignments").add(assignment)
-                            assignments_added += 1
-                        st.success(f"Import finished: {added_techs} new techs, {updated_techs} updated, {assignments_added} assignments added.")
+                    st.warning(f"CSV validation found {len(report)} warning(s); those rows/columns will be skipped.")
+                st.dataframe(report, hide_index=True)
+            if not len(errors) and len(clean):
+                key = import_key(clean)
+                done = repo.load_checkpoint(key)
+                total_chunks = -(-len(clean) // CHUNK_ROWS)
+                if done:
+                    st.info(f"{len(done)} of {total_chunks} chunk(s) of this file were already imported and will be skipped.")
+                cols = st.columns(2)
+                if cols[0].button("Preview changes (dry run)"):
+                    plan = plan_import(repo, clean, done)
+                    c = plan["counts"]
+                    st.write(f"**Dry run:** {plan['added_techs']} new techs, {plan['updated_techs']} updated; "
+                             f"{c['insert']} assignments to insert, {c['update']} to update, {c['noop']} unchanged.")
+                    changes = plan_table(plan)
+                    if changes:
+                        st.dataframe(changes, hide_index=True)
+                if cols[1].button("Bulk Import Now"):
+                    plan = plan_import(repo, clean, done)
+                    bar = st.progress(0.0, text="Importing...")
+                    started = time.perf_counter()
+
+                    def on_progress(done_rows, total):
+                        rate = done_rows / max(time.perf_counter() - started, 1e-6)
+                        bar.progress(done_rows / max(total, 1), text=f"{done_rows}/{total} rows · {rate:,.0f} rows/s")
+
+                    apply_import(repo, plan, key, on_progress)
+                    if technicians is not None:
+                        technicians.invalidate(clean["badge_id"].unique())
+                    c = plan["counts"]
+                    st.success(f"Import finished: {plan['added_techs']} new techs, {plan['updated_techs']} updated, "
+                               f"{c['insert']} assignments added, {c['update']} updated, {c['noop']} unchanged.")
 
         except Exception as e:
             st.error(f"Error reading CSV: {e}")
 
     with st.expander("\U0001F4CB CSV Template Example"):
         st.write("""
-| Technician Name | Badge ID | Photo URL | Project ID | Customer Name | Address | Scheduled Time | Truck ID |
-|-----------------|----------|-----------|------------|--------------|---------|---------------|----------|
-| John Smith      | T001     | https://...jpg | P1001 | Kim Lee  | 123 Main St | 09:00 | TK101   |
-| Jane Doe        | T002     | https://...jpg | P1002 | Sam Park | 456 Oak Rd  | 10:30 | TK102   |
+| Technician Name | Badge ID | Photo URL | Project ID | Customer Name | Customer Phone | Address | Scheduled Time | Truck ID |
+|-----------------|----------|-----------|------------|--------------|----------------|---------|---------------|----------|
+| John Smith      | T001     | https://...jpg | P1001 | Kim Lee  | +15551230001 | 123 Main St | 09:00 | TK101   |
+| Jane Doe        | T002     | https://...jpg | P1002 | Sam Park | +15551230002 | 456 Oak Rd  | 10:30 | TK102   |
         """)
-        st.markdown("**Save as .csv before uploading. 'Photo URL' is optional.**")
+        st.markdown("**Save as .csv before uploading. 'Photo URL' and 'Customer Phone' are optional.**")
@@ -0,0 +1,483 @@
+import os
+import time
+import datetime
+import threading
+import contextvars
+from zoneinfo import ZoneInfo
+from concurrent.futures import Future, ThreadPoolExecutor
+from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath
+
+# --- California Timezone ---
+CA_TZ = ZoneInfo('America/Los_Angeles')
+
+DEFAULT_PROJECT = "bright-ideas-verify-technician"
+STORAGE_BUCKET = "bright-ideas-verify-technician.firebasestorage.app"
+
+
+def cli_client():
+    """Firestore client for scripts run outside Streamlit.
+
+    Talks to the emulator when FIRESTORE_EMULATOR_HOST is set, otherwise uses
+    application default credentials.
+    """
+    from google.cloud import firestore as gc_firestore
+    return gc_firestore.Client(project=os.environ.get("GOOGLE_CLOUD_PROJECT", DEFAULT_PROJECT))
+
+
+def cli_bucket():
+    """Storage bucket for scripts; uses the emulator when STORAGE_EMULATOR_HOST is set."""
+    from google.cloud import storage
+    client = storage.Client(project=os.environ.get("GOOGLE_CLOUD_PROJECT", DEFAULT_PROJECT))
+    return client.bucket(STORAGE_BUCKET)
+
+
+# --- Batched writes ---
+BATCH_SIZE = 400  # Firestore allows 500 writes per batch
+
+
+def batched(items, size):
+    """Split `items` (any iterable) into lists of at most `size`."""
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+# --- Service date normalization ---
+_DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%m/%d/%Y", "%m/%d/%y")
+
+
+def normalize_service_date(value):
+    """Return value as a 'YYYY-MM-DD' string, or '' if it can't be read as a date."""
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(CA_TZ)
+        return value.date().isoformat()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    s = str(value or "").strip()
+    if not s:
+        return ""
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(s, fmt).date().isoformat()
+        except ValueError:
+            pass
+    try:
+        return normalize_service_date(datetime.datetime.fromisoformat(s))
+    except ValueError:
+        return ""
+
+
+def split_scheduled_time(value):
+    """Split 'HH:MM' or 'YYYY-MM-DD HH:MM' into (service_date or '', 'HH:MM')."""
+    s = str(value or "").strip()
+    if len(s) <= 5:
+        return "", s
+    try:
+        dt = datetime.datetime.fromisoformat(s)
+    except ValueError:
+        return "", s
+    return dt.date().isoformat(), dt.strftime("%H:%M")
+
+
+def normalized_assignment_fields(a):
+    """Fields of assignment dict `a` that differ from their normalized form.
+
+    Older documents may have a missing or oddly formatted service_date (the CSV
+    importer never wrote one), a full datetime in scheduled_time, or a numeric
+    badge_id. Server-side equality filters only match the normalized shape.
+    """
+    changes = {}
+    sched_date, sched_time = split_scheduled_time(a.get("scheduled_time"))
+    if sched_date:
+        changes["scheduled_time"] = sched_time
+    sdate = (normalize_service_date(a.get("service_date"))
+             or sched_date
+             or normalize_service_date(a.get("created_at")))
+    if sdate and sdate != a.get("service_date"):
+        changes["service_date"] = sdate
+    if "badge_id" in a:
+        bid = str(a["badge_id"]).strip()
+        if bid != a["badge_id"]:
+            changes["badge_id"] = bid
+    return changes
+
+
+def normalize_legacy_assignments(db, dry_run=False, batch_size=BATCH_SIZE):
+    """One-off migration that rewrites legacy assignments into the indexed shape.
+
+    Returns the number of documents that needed changes.
+    """
+    changed = 0
+    batch = db.batch()
+    pending = 0
+    for doc in db.collection("assignments").stream():
+        changes = normalized_assignment_fields(doc.to_dict())
+        if not changes:
+            continue
+        changed += 1
+        if dry_run:
+            continue
+        batch.update(doc.reference, changes)
+        pending += 1
+        if pending >= batch_size:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+    return changed
+
+
+# --- Assignment queries ---
+def assignments_query(db, for_date=None, badge_id=None, start_date=None, end_date=None):
+    """Build an assignments query with every predicate pushed to Firestore.
+
+    `for_date` is an exact service_date; `start_date`/`end_date` are an
+    inclusive range and are ignored when `for_date` is given. Range queries
+    combined with badge_id rely on the composite index in firestore.indexes.json.
+    """
+    q = db.collection("assignments")
+    if for_date is not None:
+        q = q.where(filter=FieldFilter("service_date", "==", normalize_service_date(for_date)))
+    else:
+        if start_date is not None:
+            q = q.where(filter=FieldFilter("service_date", ">=", normalize_service_date(start_date)))
+        if end_date is not None:
+            q = q.where(filter=FieldFilter("service_date", "<=", normalize_service_date(end_date)))
+    if badge_id is not None:
+        q = q.where(filter=FieldFilter("badge_id", "==", str(badge_id).strip()))
+    return q
+
+
+def query_assignments(db, for_date=None, badge_id=None, start_date=None, end_date=None):
+    out = []
+    for doc in assignments_query(db, for_date, badge_id, start_date, end_date).stream():
+        a = doc.to_dict()
+        a["_id"] = doc.id
+        out.append(a)
+    return out
+
+
+# --- Cursor pagination ---
+def fetch_page(query, page_size, start_after=None):
+    """Return (docs, has_more) for the page of `query` after snapshot `start_after`."""
+    if start_after is not None:
+        query = query.start_after(start_after)
+    docs = list(query.limit(page_size + 1).stream())
+    return docs[:page_size], len(docs) > page_size
+
+
+def technicians_query(db, order_field="badge_id", prefix=""):
+    """Technicians ordered by `order_field`, optionally limited to values starting with `prefix`."""
+    q = db.collection("technicians")
+    if prefix:
+        q = (q.where(filter=FieldFilter(order_field, ">=", prefix))
+              .where(filter=FieldFilter(order_field, "<", prefix + "\uf8ff")))
+    return q.order_by(order_field).order_by(FieldPath.document_id())
+
+
+# --- Technician directory ---
+class TechnicianDirectory:
+    """Process-wide technician cache keyed by badge_id (the document ID).
+
+    Reads and writes go through `repo` (a repository.py repository). Entries
+    expire after `ttl` seconds. Writes made through set/update/delete are
+    applied to the repository and the cache together; code that writes
+    technicians through the repository directly, like the CSV import, must
+    call invalidate() afterwards.
+    """
+
+    def __init__(self, repo, ttl=300):
+        self.repo = repo
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}  # badge_id -> (loaded_at, tech dict or None if missing)
+        self._listed_at = None
+
+    def _fresh(self, loaded_at):
+        return time.monotonic() - loaded_at < self.ttl
+
+    def list(self):
+        with self._lock:
+            if self._listed_at is not None and self._fresh(self._listed_at):
+                return [dict(t) for _, t in self._entries.values() if t is not None]
+        techs = self.repo.list_technicians()
+        now = time.monotonic()
+        with self._lock:
+            self._entries = {t["id"]: (now, t) for t in techs}
+            self._listed_at = now
+        return [dict(t) for t in techs]
+
+    def get(self, badge_id):
+        badge_id = str(badge_id).strip()
+        with self._lock:
+            hit = self._entries.get(badge_id)
+        if hit is not None and self._fresh(hit[0]):
+            return dict(hit[1]) if hit[1] is not None else None
+        tech = self.repo.get_technician(badge_id)
+        with self._lock:
+            self._entries[badge_id] = (time.monotonic(), tech)
+        return dict(tech) if tech is not None else None
+
+    def set(self, badge_id, tech_data):
+        badge_id = str(badge_id).strip()
+        self.repo.set_technician(badge_id, tech_data)
+        with self._lock:
+            self._entries[badge_id] = (time.monotonic(), {"id": badge_id, **tech_data})
+
+    def update(self, badge_id, tech_data):
+        badge_id = str(badge_id).strip()
+        self.repo.update_technician(badge_id, tech_data)
+        with self._lock:
+            hit = self._entries.get(badge_id)
+            if hit is not None and hit[1] is not None:
+                self._entries[badge_id] = (hit[0], {**hit[1], **tech_data})
+            else:
+                self._evict(badge_id)
+
+    def delete(self, badge_id):
+        badge_id = str(badge_id).strip()
+        self.repo.delete_technician(badge_id)
+        with self._lock:
+            self._entries[badge_id] = (time.monotonic(), None)
+
+    def invalidate(self, badge_ids=None):
+        """Forget the given badge IDs, or everything when none are given."""
+        with self._lock:
+            if badge_ids is None:
+                self._entries = {}
+                self._listed_at = None
+            else:
+                for badge_id in badge_ids:
+                    self._evict(str(badge_id).strip())
+
+    def _evict(self, badge_id):
+        # the cached full list no longer covers this badge, so reload it next time
+        self._entries.pop(badge_id, None)
+        self._listed_at = None
+
+
+# --- Live assignment feed ---
+class _DayFeed:
+    def __init__(self):
+        self.docs = {}  # doc id -> assignment dict with "_id"
+        self.ready = threading.Event()
+        self.watch = None
+        self.last_used = time.monotonic()
+
+
+class AssignmentFeed:
+    """Process-wide cache of each viewed day's assignments, kept current by
+    Firestore on_snapshot listeners.
+
+    The first list() for a date opens a listener on that service_date; later
+    calls (from any session) are answered from memory. Listeners idle for
+    `idle_ttl` seconds, or beyond the `max_days` most recently used, are closed
+    on the next list() and by a background sweep every `sweep_interval`
+    seconds, so a quiet app does not keep paying for days nobody views.
+    Writes made by this process should be reported with note_write/note_delete
+    so the next rerun sees them before the listener echoes them back.
+    """
+
+    def __init__(self, db, idle_ttl=900, max_days=7, ready_timeout=5, sweep_interval=60):
+        self.db = db
+        self.idle_ttl = idle_ttl
+        self.max_days = max_days
+        self.ready_timeout = ready_timeout
+        self._lock = threading.Lock()
+        self._days = {}  # service_date -> _DayFeed
+        self._closed = threading.Event()
+        self.metrics = {
+            "listener_reads": 0,    # documents delivered by listeners (billed as reads)
+            "served_from_memory": 0,
+            "fallback_reads": 0,    # documents read by queries while a listener was starting
+            "listeners_opened": 0,
+            "listeners_evicted": 0,
+        }
+        if sweep_interval:
+            threading.Thread(target=self._sweep_loop, args=(sweep_interval,), name="assignment-feed-sweep",
+                             daemon=True).start()
+
+    def list(self, for_date, badge_id=None):
+        for_date = normalize_service_date(for_date)
+        day = self._day(for_date)
+        if not day.ready.wait(self.ready_timeout):
+            out = query_assignments(self.db, for_date=for_date, badge_id=badge_id)
+            with self._lock:
+                self.metrics["fallback_reads"] += max(len(out), 1)
+            return out
+        with self._lock:
+            out = [dict(a) for a in day.docs.values()]
+            self.metrics["served_from_memory"] += 1
+        if badge_id is not None:
+            bid = str(badge_id).strip()
+            out = [a for a in out if a.get("badge_id") == bid]
+        return out
+
+    def note_write(self, doc_id, fields):
+        """Apply a write this process just made to the cached days."""
+        with self._lock:
+            current = {}
+            for day in self._days.values():
+                if doc_id in day.docs:
+                    current = day.docs.pop(doc_id)
+            merged = {**current, **fields, "_id": doc_id}
+            day = self._days.get(merged.get("service_date"))
+            if day is not None:
+                day.docs[doc_id] = merged
+
+    def note_delete(self, doc_id):
+        with self._lock:
+            for day in self._days.values():
+                day.docs.pop(doc_id, None)
+
+    def sweep(self):
+        """Close the listeners of days not viewed within `idle_ttl`; returns how many were closed."""
+        with self._lock:
+            stale = self._evictable()
+        for day in stale:
+            if day.watch is not None:
+                day.watch.unsubscribe()
+        return len(stale)
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            days, self._days = self._days, {}
+        for day in days.values():
+            if day.watch is not None:
+                day.watch.unsubscribe()
+
+    def _day(self, for_date):
+        with self._lock:
+            day = self._days.get(for_date)
+            if day is not None and day.watch is not None and not day.watch.is_active:
+                day = None  # listener died; start a new one
+            if day is None:
+                day = self._days[for_date] = _DayFeed()
+                self.metrics["listeners_opened"] += 1
+                start = True
+            else:
+                start = False
+            day.last_used = time.monotonic()
+            stale = self._evictable()
+        for old in stale:
+            if old.watch is not None:
+                old.watch.unsubscribe()
+        if start:
+            query = self.db.collection("assignments").where(filter=FieldFilter("service_date", "==", for_date))
+            day.watch = query.on_snapshot(lambda docs, changes, read_time: self._on_snapshot(day, changes))
+            with self._lock:
+                evicted = self._days.get(for_date) is not day
+            if evicted:
+                day.watch.unsubscribe()
+        return day
+
+    def _sweep_loop(self, interval):
+        while not self._closed.wait(interval):
+            self.sweep()
+
+    def _evictable(self):
+        # caller holds self._lock
+        now = time.monotonic()
+        by_age = sorted(self._days.items(), key=lambda kv: kv[1].last_used, reverse=True)
+        stale = []
+        for i, (key, day) in enumerate(by_age):
+            if i >= self.max_days or now - day.last_used > self.idle_ttl:
+                stale.append(self._days.pop(key))
+        self.metrics["listeners_evicted"] += len(stale)
+        return stale
+
+    def _on_snapshot(self, day, changes):
+        # runs on the listener's background thread
+        with self._lock:
+            for change in changes:
+                doc = change.document
+                if change.type.name == "REMOVED":
+                    day.docs.pop(doc.id, None)
+                else:
+                    day.docs[doc.id] = {**doc.to_dict(), "_id": doc.id}
+            self.metrics["listener_reads"] += len(changes)
+        day.ready.set()
+
+
+# --- Verify page data ---
+class VerifyPageCache:
+    """Short-TTL cache of (technician, jobs) for the customer verify page, keyed
+    by (badge_id, service_date).
+
+    On a miss the technician document get and the indexed jobs query run at the
+    same time, and concurrent misses for the same key share one fetch, so a
+    burst of customers opening the same SMS link costs a single pair of reads.
+    """
+
+    def __init__(self, db, technicians, ttl=30, max_workers=8):
+        self.db = db
+        self.technicians = technicians
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="verify")
+        self._lock = threading.Lock()
+        self._entries = {}  # (badge_id, date) -> (loaded_at, tech, jobs)
+        self._inflight = {}  # (badge_id, date) -> Future
+
+    def get(self, badge_id, for_date):
+        key = (str(badge_id).strip(), normalize_service_date(for_date))
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None and time.monotonic() - hit[0] < self.ttl:
+                return self._copy(hit[1], hit[2])
+            fut = self._inflight.get(key)
+            owner = fut is None
+            if owner:
+                fut = self._inflight[key] = Future()
+        if owner:
+            try:
+                # copy the context so the pool thread's reads count toward this rerun
+                tech_f = self._pool.submit(contextvars.copy_context().run, self.technicians.get, key[0])
+                jobs = query_assignments(self.db, for_date=key[1], badge_id=key[0])
+                jobs.sort(key=lambda a: a.get("scheduled_time", ""))
+                result = (tech_f.result(), jobs)
+            except Exception as e:
+                fut.set_exception(e)
+                with self._lock:
+                    del self._inflight[key]
+                raise
+            with self._lock:
+                self._entries[key] = (time.monotonic(), *result)
+                del self._inflight[key]
+            fut.set_result(result)
+        tech, jobs = fut.result()
+        return self._copy(tech, jobs)
+
+    def forget_assignment(self, doc_id):
+        """Drop every cached page that shows assignment `doc_id`."""
+        with self._lock:
+            for key, (_, _, jobs) in list(self._entries.items()):
+                if any(a["_id"] == doc_id for a in jobs):
+                    del self._entries[key]
+
+    def invalidate(self, badge_id=None):
+        with self._lock:
+            if badge_id is None:
+                self._entries = {}
+            else:
+                bid = str(badge_id).strip()
+                self._entries = {k: v for k, v in self._entries.items() if k[0] != bid}
+
+    @staticmethod
+    def _copy(tech, jobs):
+        return (dict(tech) if tech is not None else None), [dict(a) for a in jobs]
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Bright Ideas Firestore maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("normalize", help="rewrite legacy assignments so indexed queries find them")
+    p.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    if args.command == "normalize":
+        n = normalize_legacy_assignments(cli_client(), dry_run=args.dry_run)
+        print(f"{n} assignments {'need' if args.dry_run else 'were'} normalized")
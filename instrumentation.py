@@ -0,0 +1,320 @@
+import os
+import json
+import time
+import functools
+import threading
+import contextvars
+from google.cloud.firestore_v1.base_query import BaseQuery
+from google.cloud.firestore_v1.base_collection import BaseCollectionReference
+from google.cloud.firestore_v1.base_document import BaseDocumentReference
+from google.cloud.firestore_v1.base_batch import BaseWriteBatch
+from google.cloud.firestore_v1.base_transaction import BaseTransaction
+
+# --- Cost accounting for Firestore / Storage ---
+# Reads follow Firestore billing: one per returned document, at least one per
+# query. Bytes are estimated with Firestore's document size rules.
+
+STATS_LOG = os.environ.get("FIRESTORE_STATS_LOG", "")
+COUNTERS = ("reads", "writes", "deletes", "round_trips", "bytes_read", "bytes_written")
+
+
+class Stats:
+    def __init__(self, label=""):
+        self.label = label
+        self.started = time.time()
+        self.totals = dict.fromkeys(COUNTERS, 0)
+        self.ops = {}      # "collection.op" -> counters + calls
+        self.timings = {}  # helper name -> [calls, seconds]
+        self.logged = False
+        self._lock = threading.Lock()
+
+    def record(self, op, **counts):
+        with self._lock:
+            row = self.ops.setdefault(op, dict.fromkeys(("calls",) + COUNTERS, 0))
+            row["calls"] += 1
+            for k, v in counts.items():
+                row[k] += v
+                self.totals[k] += v
+
+    def add_timing(self, name, seconds):
+        with self._lock:
+            t = self.timings.setdefault(name, [0, 0.0])
+            t[0] += 1
+            t[1] += seconds
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "ts": self.started,
+                "label": self.label,
+                "totals": dict(self.totals),
+                "ops": {k: dict(v) for k, v in self.ops.items()},
+                "timings": {k: {"calls": c, "seconds": round(s, 6)} for k, (c, s) in self.timings.items()},
+            }
+
+
+# Work done outside any rerun (snapshot listeners, pool threads) goes to `background`.
+background = Stats("background")
+process_totals = Stats("process")
+_current = contextvars.ContextVar("firestore_stats", default=None)
+
+
+def current():
+    return _current.get()
+
+
+def start_rerun(label):
+    stats = Stats(label)
+    _current.set(stats)
+    return stats
+
+
+def finish_rerun(stats):
+    if stats.logged:
+        return
+    stats.logged = True
+    if STATS_LOG:
+        with open(STATS_LOG, "a") as f:
+            f.write(json.dumps(stats.as_dict()) + "\n")
+
+
+def _record(op, **counts):
+    (current() or background).record(op, **counts)
+    process_totals.record(op, **counts)
+
+
+def timed(name):
+    """Decorator adding a helper's wall time to the current rerun's stats."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                (current() or background).add_timing(name, time.perf_counter() - start)
+        return inner
+    return wrap
+
+
+def doc_size(value):
+    """Approximate stored size in bytes of a Firestore value."""
+    if isinstance(value, dict):
+        return sum(len(str(k)) + 1 + doc_size(v) for k, v in value.items()) + 32
+    if isinstance(value, (list, tuple)):
+        return sum(doc_size(v) for v in value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8")) + 1
+    if isinstance(value, bytes):
+        return len(value)
+    if value is None or isinstance(value, bool):
+        return 1
+    return 8
+
+
+def _snap_size(snap):
+    # _data avoids the deep copy to_dict() makes of every document
+    data = getattr(snap, "_data", None)
+    return doc_size(data if data is not None else snap.to_dict() or {})
+
+
+# --- Proxies ---
+def _unwrap(value):
+    if isinstance(value, _Proxy):
+        return value._target
+    if isinstance(value, list):
+        return [_unwrap(v) for v in value]
+    return value
+
+
+def _wrap(value):
+    if isinstance(value, (BaseQuery, BaseCollectionReference, BaseDocumentReference)):
+        return _Ref(value)
+    if isinstance(value, BaseTransaction):
+        return _Transaction(value)
+    if isinstance(value, BaseWriteBatch):
+        return _Batch(value)
+    return value
+
+
+class _Proxy:
+    """Forwards everything to the wrapped client object, re-wrapping any
+    references/queries it returns and unwrapping any proxies passed in."""
+
+    def __init__(self, target):
+        object.__setattr__(self, "_target", target)
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return _wrap(attr)
+
+        def call(*args, **kwargs):
+            args = [_unwrap(a) for a in args]
+            kwargs = {k: _unwrap(v) for k, v in kwargs.items()}
+            return _wrap(attr(*args, **kwargs))
+        return call
+
+    def __setattr__(self, name, value):
+        setattr(self._target, name, value)
+
+    def __eq__(self, other):
+        return self._target == _unwrap(other)
+
+    def __hash__(self):
+        return hash(self._target)
+
+    def __repr__(self):
+        return f"Instrumented({self._target!r})"
+
+
+class _Ref(_Proxy):
+    """CollectionReference, Query or DocumentReference."""
+
+    def _name(self, op):
+        t = self._target
+        if isinstance(t, BaseDocumentReference):
+            col = t.parent.id
+        else:
+            col = getattr(t, "id", None) or t._parent.id
+        return f"{col}.{op}"
+
+    def stream(self, *args, **kwargs):
+        kwargs = {k: _unwrap(v) for k, v in kwargs.items()}
+        return self._count_docs("stream", self._target.stream(*args, **kwargs))
+
+    def get(self, *args, **kwargs):
+        kwargs = {k: _unwrap(v) for k, v in kwargs.items()}
+        result = self._target.get(*args, **kwargs)
+        if isinstance(self._target, BaseDocumentReference):
+            _record(self._name("get"), reads=1, round_trips=1, bytes_read=_snap_size(result) if result.exists else 0)
+            return result
+        if isinstance(result, list):
+            return list(self._count_docs("get", iter(result)))
+        return result  # aggregation results
+
+    def _count_docs(self, op, docs):
+        n = size = 0
+        try:
+            for doc in docs:
+                n += 1
+                size += _snap_size(doc)
+                yield doc
+        finally:
+            _record(self._name(op), reads=max(n, 1), round_trips=1, bytes_read=size)
+
+    def set(self, data, *args, **kwargs):
+        _record(self._name("set"), writes=1, round_trips=1, bytes_written=doc_size(data))
+        return self._target.set(data, *args, **kwargs)
+
+    def update(self, data, *args, **kwargs):
+        _record(self._name("update"), writes=1, round_trips=1, bytes_written=doc_size(data))
+        return self._target.update(data, *args, **kwargs)
+
+    def create(self, data, *args, **kwargs):
+        _record(self._name("create"), writes=1, round_trips=1, bytes_written=doc_size(data))
+        return self._target.create(data, *args, **kwargs)
+
+    def add(self, data, *args, **kwargs):
+        _record(self._name("add"), writes=1, round_trips=1, bytes_written=doc_size(data))
+        update_time, ref = self._target.add(data, *args, **kwargs)
+        return update_time, _wrap(ref)
+
+    def delete(self, *args, **kwargs):
+        _record(self._name("delete"), deletes=1, round_trips=1)
+        return self._target.delete(*args, **kwargs)
+
+    def on_snapshot(self, callback):
+        name = self._name("listen")
+
+        def counted(docs, changes, read_time):
+            _record(name, reads=len(changes), bytes_read=sum(_snap_size(c.document) for c in changes if c.type.name != "REMOVED"))
+            return callback(docs, changes, read_time)
+        _record(name, round_trips=1)
+        return self._target.on_snapshot(counted)
+
+    def count(self, *args, **kwargs):
+        return _Aggregation(self._target.count(*args, **kwargs), self._name("count"))
+
+
+class _Aggregation(_Proxy):
+    def __init__(self, target, name):
+        super().__init__(target)
+        object.__setattr__(self, "_op", name)
+
+    def get(self, *args, **kwargs):
+        # billed as one read per batch of up to 1000 index entries; count the minimum
+        _record(self._op, reads=1, round_trips=1)
+        return self._target.get(*args, **kwargs)
+
+
+class _Batch(_Proxy):
+    def set(self, ref, data, *args, **kwargs):
+        _record("batch.set", writes=1, bytes_written=doc_size(data))
+        return self._target.set(_unwrap(ref), data, *args, **kwargs)
+
+    def update(self, ref, data, *args, **kwargs):
+        _record("batch.update", writes=1, bytes_written=doc_size(data))
+        return self._target.update(_unwrap(ref), data, *args, **kwargs)
+
+    def delete(self, ref, *args, **kwargs):
+        _record("batch.delete", deletes=1)
+        return self._target.delete(_unwrap(ref), *args, **kwargs)
+
+    def commit(self, *args, **kwargs):
+        _record("batch.commit", round_trips=1)
+        return self._target.commit(*args, **kwargs)
+
+
+class _Transaction(_Batch):
+    # @transactional commits through _commit(); reads go through ref.get(transaction=...)
+    def _commit(self, *args, **kwargs):
+        _record("transaction.commit", round_trips=1)
+        return self._target._commit(*args, **kwargs)
+
+
+class InstrumentedClient(_Proxy):
+    """Drop-in wrapper for firestore.client() that counts every operation."""
+
+    def get_all(self, references, *args, **kwargs):
+        n = size = 0
+        try:
+            for snap in self._target.get_all(_unwrap(list(references)), *args, **kwargs):
+                n += 1
+                if snap.exists:
+                    size += _snap_size(snap)
+                yield snap
+        finally:
+            _record("client.get_all", reads=n, round_trips=1, bytes_read=size)
+
+
+class _Blob(_Proxy):
+    def upload_from_string(self, data, *args, **kwargs):
+        _record("storage.upload", writes=1, round_trips=1, bytes_written=len(data))
+        return self._target.upload_from_string(data, *args, **kwargs)
+
+    def upload_from_file(self, file_obj, *args, **kwargs):
+        _record("storage.upload", writes=1, round_trips=1)
+        return self._target.upload_from_file(file_obj, *args, **kwargs)
+
+    def download_as_bytes(self, *args, **kwargs):
+        data = self._target.download_as_bytes(*args, **kwargs)
+        _record("storage.download", reads=1, round_trips=1, bytes_read=len(data))
+        return data
+
+    def exists(self, *args, **kwargs):
+        _record("storage.exists", reads=1, round_trips=1)
+        return self._target.exists(*args, **kwargs)
+
+    def make_public(self, *args, **kwargs):
+        _record("storage.make_public", writes=1, round_trips=1)
+        return self._target.make_public(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        _record("storage.delete", deletes=1, round_trips=1)
+        return self._target.delete(*args, **kwargs)
+
+
+class InstrumentedBucket(_Proxy):
+    def blob(self, *args, **kwargs):
+        return _Blob(self._target.blob(*args, **kwargs))
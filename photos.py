@@ -0,0 +1,61 @@
+import io
+import hashlib
+
+PHOTO_PREFIX = "technician_photos"
+# variant -> longest edge in px, about 2x the size it is displayed at
+VARIANTS = {
+    "thumb": 240,  # technician list, shown at 120px
+    "card": 400,   # verify page badge card
+}
+# Technician fields written by upload_photo; anything that replaces
+# photo_url on its own must clear the others.
+VARIANT_FIELDS = ["photo_thumb_url", "photo_card_url", "photo_hash"]
+CACHE_CONTROL = "public, max-age=31536000, immutable"  # blob names are content hashes
+
+
+def resize_photo(data, size):
+    from PIL import Image, ImageOps  # only needed when a photo is uploaded
+    img = Image.open(io.BytesIO(data))
+    img = ImageOps.exif_transpose(img).convert("RGB")
+    img.thumbnail((size, size))
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=85, optimize=True)
+    return out.getvalue()
+
+
+def _upload(blob, data, content_type):
+    blob.cache_control = CACHE_CONTROL
+    blob.upload_from_string(data, content_type=content_type)
+    blob.make_public()
+
+
+def upload_photo(bucket, photo_file):
+    """Upload a Streamlit UploadedFile plus its resized variants, straight from memory.
+
+    Blobs are keyed by the SHA-256 of the original bytes, so uploading the same
+    photo again (for the same or another technician) skips all uploads. The
+    original is written last and marks the set as complete. Returns the photo
+    fields to store on the technician document.
+    """
+    data = photo_file.getvalue()
+    digest = hashlib.sha256(data).hexdigest()
+    original = bucket.blob(f"{PHOTO_PREFIX}/{digest}/original")
+    blobs = {name: bucket.blob(f"{PHOTO_PREFIX}/{digest}/{name}.jpg") for name in VARIANTS}
+    if not original.exists():
+        for name, size in VARIANTS.items():
+            _upload(blobs[name], resize_photo(data, size), "image/jpeg")
+        _upload(original, data, photo_file.type or "application/octet-stream")
+    return {
+        "photo_url": original.public_url,
+        "photo_thumb_url": blobs["thumb"].public_url,
+        "photo_card_url": blobs["card"].public_url,
+        "photo_hash": digest,
+    }
+
+
+def thumb_url(tech):
+    return tech.get("photo_thumb_url") or tech.get("photo_url", "")
+
+
+def card_url(tech):
+    return tech.get("photo_card_url") or tech.get("photo_url", "")
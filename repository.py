@@ -0,0 +1,343 @@
+import uuid
+import hashlib
+import datetime
+import threading
+from google.cloud.firestore_v1 import ArrayUnion, DELETE_FIELD
+from firebase_utils import BATCH_SIZE, CA_TZ, batched, fetch_page, normalize_service_date, query_assignments, technicians_query
+from csv_export import EXPORT_COLUMNS, PAGE_SIZE, count_assignments, iter_assignment_pages
+from photos import PHOTO_PREFIX, upload_photo
+from summaries import (add_with_summary, count_day, delete_with_summary, load_summary, rebuild_summary, summary_delta,
+                       update_with_summary, write_deltas)
+
+# --- Data access ---
+# Technicians, assignments and photos behind one API with two backends:
+# FirestoreRepository (Firestore + Cloud Storage, or their emulators) and
+# MemoryRepository (plain dicts), so imports, exports and lookups can be run
+# and timed without Firebase. TechnicianDirectory caches technicians on top of
+# a repository; the assignment caches in firebase_utils stay on the Firestore
+# client, since they rely on snapshot listeners.
+
+GET_ALL_SIZE = 300
+
+
+def _now():
+    return datetime.datetime.now(CA_TZ).isoformat()
+
+
+class FirestoreRepository:
+    """Firestore-backed repository. `bucket` is a Storage bucket or a callable
+    returning one, so the storage client is only built for photo uploads.
+    With an archive.ArchiveReader, exports include archived months."""
+
+    def __init__(self, db, bucket=None, archive=None):
+        self.db = db
+        self._bucket = bucket
+        self.archive = archive
+
+    # technicians
+    def list_technicians(self):
+        return [{"id": t.id, **t.to_dict()} for t in self.db.collection("technicians").stream()]
+
+    def get_technician(self, badge_id):
+        snap = self.db.collection("technicians").document(str(badge_id).strip()).get()
+        return {"id": snap.id, **snap.to_dict()} if snap.exists else None
+
+    def get_technicians(self, badge_ids):
+        """{badge_id: data} for the badges that exist, fetched with get_all."""
+        return self._get_all("technicians", badge_ids)
+
+    def page_technicians(self, order_field="badge_id", prefix="", page_size=25, start_after=None):
+        """One page of technicians ordered by `order_field`, limited to values
+        starting with `prefix` if given. Returns (technicians, cursor of the
+        next page or None); cursors are opaque and only go back into this call."""
+        docs, has_more = fetch_page(technicians_query(self.db, order_field, prefix), page_size, start_after)
+        return [{"id": d.id, **d.to_dict()} for d in docs], (docs[-1] if has_more else None)
+
+    def set_technician(self, badge_id, data):
+        self.db.collection("technicians").document(str(badge_id).strip()).set(data)
+
+    def update_technician(self, badge_id, fields):
+        self.db.collection("technicians").document(str(badge_id).strip()).update(fields)
+
+    def delete_technician(self, badge_id):
+        self.db.collection("technicians").document(str(badge_id).strip()).delete()
+
+    def write_technicians(self, sets, updates):
+        """Set whole documents from `sets` and update fields from `updates`, both {badge_id: data}, in batches."""
+        col = self.db.collection("technicians")
+        writes = [("set", b, data) for b, data in sets.items()] + [("update", b, data) for b, data in updates.items()]
+        for chunk in batched(writes, BATCH_SIZE):
+            batch = self.db.batch()
+            for op, badge_id, data in chunk:
+                getattr(batch, op)(col.document(badge_id), data)
+            batch.commit()
+
+    # assignments
+    def list_assignments(self, for_date=None, badge_id=None, start_date=None, end_date=None):
+        return query_assignments(self.db, for_date, badge_id, start_date, end_date)
+
+    def get_assignments(self, ids):
+        return self._get_all("assignments", ids)
+
+    def add_assignment(self, data):
+        return add_with_summary(self.db, data)
+
+    def update_assignment(self, doc_id, fields):
+        update_with_summary(self.db, doc_id, fields)
+
+    def delete_assignment(self, doc_id):
+        delete_with_summary(self.db, doc_id)
+
+    def write_assignments(self, ops, deltas=None, checkpoint=None):
+        """Apply (doc_id, "insert" | "update", payload) ops, summary_delta()
+        changes and an import checkpoint (key, chunk, total_chunks) in one
+        atomic batch; keep ops to BATCH_SIZE or fewer."""
+        col = self.db.collection("assignments")
+        batch = self.db.batch()
+        for doc_id, action, payload in ops:
+            if action == "insert":
+                batch.set(col.document(doc_id), payload)
+            else:
+                batch.update(col.document(doc_id), payload)
+        if deltas:
+            write_deltas(batch, self.db, deltas)
+        if checkpoint is not None:
+            key, chunk, total = checkpoint
+            batch.set(self.db.collection("imports").document(key), {
+                "done_chunks": ArrayUnion([chunk]),
+                "total_chunks": total,
+                "updated_at": _now(),
+            }, merge=True)
+        batch.commit()
+
+    def iter_assignment_pages(self, start_date, end_date, badge_ids=None, page_size=PAGE_SIZE):
+        return iter_assignment_pages(self.db, start_date, end_date, badge_ids, page_size, archive=self.archive)
+
+    def count_assignments(self, start_date, end_date, badge_ids=None):
+        """Upper bound on the rows iter_assignment_pages() yields, without reading documents."""
+        return count_assignments(self.db, start_date, end_date, badge_ids, archive=self.archive)
+
+    def load_summary(self, service_date):
+        return load_summary(self.db, service_date)
+
+    def count_day(self, service_date):
+        """(jobs, verified) counted from the day's live assignments."""
+        return count_day(self.db, service_date)
+
+    def rebuild_summary(self, service_date):
+        return rebuild_summary(self.db, service_date)
+
+    def load_checkpoint(self, key):
+        """Indexes of the chunks of import `key` that were already committed."""
+        snap = self.db.collection("imports").document(key).get()
+        return set(snap.to_dict().get("done_chunks", [])) if snap.exists else set()
+
+    # photos
+    def upload_photo(self, photo_file):
+        bucket = self._bucket() if callable(self._bucket) else self._bucket
+        return upload_photo(bucket, photo_file)
+
+    def _get_all(self, collection, ids):
+        col = self.db.collection(collection)
+        out = {}
+        for chunk in batched(dict.fromkeys(ids), GET_ALL_SIZE):
+            for snap in self.db.get_all([col.document(doc_id) for doc_id in chunk]):
+                if snap.exists:
+                    out[snap.id] = snap.to_dict()
+        return out
+
+
+class MemoryRepository:
+    """The same API over plain dicts, for benchmarks and local runs without Firebase.
+
+    Assignments are indexed by service_date, so day lookups touch only that
+    day's jobs, like the indexed Firestore queries. Every call holds one lock,
+    which makes each write atomic the way a batch or transaction is.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.technicians = {}
+        self.assignments = {}
+        self.summaries = {}
+        self.checkpoints = {}
+        self.photos = {}  # digest -> original bytes
+        self._by_date = {}  # service_date -> set of assignment IDs
+
+    # technicians
+    def list_technicians(self):
+        with self._lock:
+            return [{"id": b, **t} for b, t in self.technicians.items()]
+
+    def get_technician(self, badge_id):
+        badge_id = str(badge_id).strip()
+        with self._lock:
+            tech = self.technicians.get(badge_id)
+            return {"id": badge_id, **tech} if tech is not None else None
+
+    def get_technicians(self, badge_ids):
+        with self._lock:
+            return {b: dict(self.technicians[b]) for b in badge_ids if b in self.technicians}
+
+    def page_technicians(self, order_field="badge_id", prefix="", page_size=25, start_after=None):
+        def key(t):
+            return str(t.get(order_field, "")), t["id"]
+        with self._lock:
+            techs = sorted(({"id": b, **t} for b, t in self.technicians.items()
+                            if str(t.get(order_field, "")).startswith(prefix)), key=key)
+        if start_after is not None:
+            techs = [t for t in techs if key(t) > start_after]
+        page = techs[:page_size]
+        return page, (key(page[-1]) if len(techs) > page_size else None)
+
+    def set_technician(self, badge_id, data):
+        with self._lock:
+            self.technicians[str(badge_id).strip()] = dict(data)
+
+    def update_technician(self, badge_id, fields):
+        with self._lock:
+            self._apply(self.technicians[str(badge_id).strip()], fields)
+
+    def delete_technician(self, badge_id):
+        with self._lock:
+            self.technicians.pop(str(badge_id).strip(), None)
+
+    def write_technicians(self, sets, updates):
+        with self._lock:
+            for badge_id, data in sets.items():
+                self.technicians[badge_id] = dict(data)
+            for badge_id, fields in updates.items():
+                self._apply(self.technicians[badge_id], fields)
+
+    # assignments
+    def list_assignments(self, for_date=None, badge_id=None, start_date=None, end_date=None):
+        with self._lock:
+            if for_date is not None:
+                ids = self._by_date.get(normalize_service_date(for_date), ())
+            elif start_date is not None or end_date is not None:
+                lo = normalize_service_date(start_date) if start_date is not None else ""
+                hi = normalize_service_date(end_date) if end_date is not None else "\uf8ff"
+                ids = [i for d, day in self._by_date.items() if lo <= d <= hi for i in day]
+            else:
+                ids = list(self.assignments)
+            bid = str(badge_id).strip() if badge_id is not None else None
+            return [{**self.assignments[i], "_id": i} for i in ids
+                    if bid is None or self.assignments[i].get("badge_id") == bid]
+
+    def get_assignments(self, ids):
+        with self._lock:
+            return {i: dict(self.assignments[i]) for i in ids if i in self.assignments}
+
+    def add_assignment(self, data):
+        doc_id = uuid.uuid4().hex[:20]
+        with self._lock:
+            self._put(doc_id, dict(data))
+            self._count(summary_delta(None, data))
+        return doc_id
+
+    def update_assignment(self, doc_id, fields):
+        with self._lock:
+            before = self.assignments[doc_id]
+            after = self._apply(dict(before), fields)
+            self._put(doc_id, after)
+            self._count(summary_delta(before, after))
+
+    def delete_assignment(self, doc_id):
+        with self._lock:
+            before = self.assignments.pop(doc_id, None)
+            if before is not None:
+                self._by_date.get(before.get("service_date"), set()).discard(doc_id)
+                self._count(summary_delta(before, None))
+
+    def write_assignments(self, ops, deltas=None, checkpoint=None):
+        with self._lock:
+            for doc_id, action, payload in ops:
+                if action == "insert":
+                    self._put(doc_id, dict(payload))
+                else:
+                    self._put(doc_id, self._apply(dict(self.assignments[doc_id]), payload))
+            if deltas:
+                self._count(deltas)
+            if checkpoint is not None:
+                key, chunk, total = checkpoint
+                done = self.checkpoints.setdefault(key, {"done_chunks": set()})
+                done["done_chunks"].add(chunk)
+                done.update({"total_chunks": total, "updated_at": _now()})
+
+    def iter_assignment_pages(self, start_date, end_date, badge_ids=None, page_size=PAGE_SIZE):
+        rows = self.list_assignments(start_date=start_date, end_date=end_date)
+        if badge_ids:
+            wanted = {str(b).strip() for b in badge_ids}
+            rows = [a for a in rows if a.get("badge_id") in wanted]
+        rows.sort(key=lambda a: (a.get("service_date", ""), a["_id"]))
+        for chunk in batched(rows, page_size):
+            yield [{col: a.get(col) if col != "id" else a["_id"] for col in EXPORT_COLUMNS} for a in chunk]
+
+    def count_assignments(self, start_date, end_date, badge_ids=None):
+        return sum(len(page) for page in self.iter_assignment_pages(start_date, end_date, badge_ids))
+
+    def load_summary(self, service_date):
+        with self._lock:
+            summary = self.summaries.get(normalize_service_date(service_date))
+            return {**summary, "technicians": {b: dict(t) for b, t in summary.get("technicians", {}).items()},
+                    "trucks": dict(summary.get("trucks", {}))} if summary is not None else None
+
+    def count_day(self, service_date):
+        with self._lock:
+            day = [self.assignments[i] for i in self._by_date.get(normalize_service_date(service_date), ())]
+            return len(day), sum(1 for a in day if a.get("verified"))
+
+    def rebuild_summary(self, service_date):
+        service_date = normalize_service_date(service_date)
+        with self._lock:
+            deltas = {}
+            for doc_id in self._by_date.get(service_date, ()):
+                summary_delta(None, self.assignments[doc_id], deltas)
+            self.summaries[service_date] = {"service_date": service_date, "jobs": 0, "verified": 0}
+            self._count(deltas)
+            self.summaries[service_date]["updated_at"] = _now()
+            return self.load_summary(service_date)
+
+    def load_checkpoint(self, key):
+        with self._lock:
+            return set(self.checkpoints.get(key, {}).get("done_chunks", ()))
+
+    # photos
+    def upload_photo(self, photo_file):
+        data = photo_file.getvalue()
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            self.photos.setdefault(digest, data)
+        url = f"memory://{PHOTO_PREFIX}/{digest}/original"
+        # no resizing here: every variant points at the original
+        return {"photo_url": url, "photo_thumb_url": url, "photo_card_url": url, "photo_hash": digest}
+
+    def _put(self, doc_id, data):
+        old = self.assignments.get(doc_id)
+        if old is not None and old.get("service_date") != data.get("service_date"):
+            self._by_date.get(old.get("service_date"), set()).discard(doc_id)
+        self.assignments[doc_id] = data
+        self._by_date.setdefault(data.get("service_date"), set()).add(doc_id)
+
+    @staticmethod
+    def _apply(doc, fields):
+        for k, v in fields.items():
+            if v is DELETE_FIELD:
+                doc.pop(k, None)
+            else:
+                doc[k] = v
+        return doc
+
+    def _count(self, deltas):
+        now = _now()
+        for service_date, changes in deltas.items():
+            changes = {p: v for p, v in changes.items() if v}
+            if not changes:
+                continue
+            summary = self.summaries.setdefault(service_date, {"service_date": service_date})
+            for path, value in changes.items():
+                node = summary
+                for key in path[:-1]:
+                    node = node.setdefault(key, {})
+                node[path[-1]] = value if isinstance(value, str) else node.get(path[-1], 0) + value
+            summary["updated_at"] = now
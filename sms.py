@@ -0,0 +1,198 @@
+import io
+import csv
+import time
+import queue
+import threading
+import datetime
+import functools
+from collections import Counter
+from urllib.parse import quote
+
+# --- Verification SMS ---
+VERIFY_BASE_URL = "https://energybicverification.streamlit.app/"
+
+MESSAGE = (
+    "Bright Ideas Construction\n"
+    "📅 Service: {service_date} at {time}\n"
+    "👷 Technician: {technician_name}\n"
+    "🔧 Project #: {project_id}\n"
+    "🏠 Address: {address}\n"
+    "🚚 Truck: {truck_id}\n"
+    "✅ Verify: {verify_url}\n"
+)
+
+SHEET_COLUMNS = ["technician_name", "badge_id", "service_date", "scheduled_time", "customer_name",
+                 "customer_phone", "project_id", "id", "message"]
+
+
+@functools.lru_cache(maxsize=4096)
+def verify_url(badge_id):
+    return f"{VERIFY_BASE_URL}?view=verify&badge_id={quote(str(badge_id).strip())}"
+
+
+def display_time(scheduled_time):
+    """"HH:MM" as "09:30 AM"; anything else is shown as stored."""
+    try:
+        return datetime.datetime.strptime(scheduled_time, "%H:%M").strftime("%I:%M %p")
+    except (TypeError, ValueError):
+        return scheduled_time or ""
+
+
+def render_message(a, url=None):
+    """Verification text for assignment `a`; pass `url` to reuse an already built verify link."""
+    return MESSAGE.format(
+        service_date=a.get("service_date", ""),
+        time=display_time(a.get("scheduled_time")),
+        technician_name=a.get("technician_name", ""),
+        project_id=a.get("project_id", ""),
+        address=a.get("address", ""),
+        truck_id=a.get("truck_id", ""),
+        verify_url=url or verify_url(a.get("badge_id", "")),
+    )
+
+
+def dispatch_sheet(jobs):
+    """Render every message for a day's jobs in one pass.
+
+    Rows are grouped by technician and sorted by scheduled_time within each
+    group; each technician's verify URL is built once and shared by their rows.
+    """
+    urls = {}
+    rows = []
+    for a in sorted(jobs, key=lambda a: (a.get("technician_name", ""), a.get("badge_id", ""), a.get("scheduled_time", ""))):
+        badge = a.get("badge_id", "")
+        url = urls.get(badge)
+        if url is None:
+            url = urls[badge] = verify_url(badge)
+        rows.append({
+            "technician_name": a.get("technician_name", ""),
+            "badge_id": badge,
+            "service_date": a.get("service_date", ""),
+            "scheduled_time": a.get("scheduled_time", ""),
+            "customer_name": a.get("customer_name", ""),
+            "customer_phone": a.get("customer_phone", ""),
+            "project_id": a.get("project_id", ""),
+            "id": a.get("_id", ""),
+            "message": render_message(a, url),
+        })
+    return rows
+
+
+def sheet_csv(rows):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=SHEET_COLUMNS)
+    writer.writeheader()
+    writer.writerows(rows)
+    return out.getvalue().encode("utf-8")
+
+
+def sheet_txt(rows):
+    """Plain-text sheet: one section per technician, messages in time order."""
+    counts = Counter(r["badge_id"] for r in rows)
+    parts = []
+    badge = None
+    for r in rows:
+        if r["badge_id"] != badge:
+            badge = r["badge_id"]
+            parts.append(f"==== {r['technician_name']} ({badge}) · {counts[badge]} job(s) ====\n")
+        parts.append(r["message"] + "\n")
+    return "".join(parts).encode("utf-8")
+
+
+# --- Sending ---
+class StubSender:
+    """Sender that records messages instead of sending them, for local testing.
+
+    A real sender implements the same send(row) method, where `row` is a
+    dispatch_sheet() row, and raises on failure.
+    """
+
+    def __init__(self):
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send(self, row):
+        with self._lock:
+            self.sent.append({"to": row.get("customer_phone", ""), "id": row.get("id", ""), "body": row["message"],
+                              "at": datetime.datetime.now().isoformat()})
+
+
+class SendQueue:
+    """Feeds dispatch_sheet() rows to a sender from one background thread, at
+    most `rate` messages per second (token bucket allowing `burst` at once).
+
+    Rows are keyed by their assignment id: putting a row that is already
+    queued or sent again is a no-op, and rows without a customer_phone are
+    never queued. Failed rows are recorded with their error and not retried,
+    but can be put again.
+    """
+
+    def __init__(self, sender, rate=1.0, burst=5):
+        self.sender = sender
+        self.rate = rate
+        self.burst = burst
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.metrics = {"queued": 0, "sent": 0, "failed": 0}
+        self.errors = []  # (row id, error message)
+        self._ids = set()  # ids of rows queued or sent
+        self._thread = threading.Thread(target=self._run, name="sms-send", daemon=True)
+        self._thread.start()
+
+    def put(self, rows):
+        """Queue the rows that have a phone number and are not already queued or
+        sent; returns how many were queued."""
+        with self._lock:
+            new = []
+            for row in rows:
+                row_id = row.get("id", "")
+                if not str(row.get("customer_phone") or "").strip() or (row_id and row_id in self._ids):
+                    continue
+                self._ids.add(row_id)
+                new.append(row)
+            self.metrics["queued"] += len(new)
+        for row in new:
+            self._queue.put(row)
+        return len(new)
+
+    def pending(self):
+        return self._queue.unfinished_tasks
+
+    def drain(self, timeout=None):
+        """Wait until every queued row was handed to the sender; False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        tokens, last = float(self.burst), time.monotonic()
+        while True:
+            row = self._queue.get()
+            if row is None:
+                self._queue.task_done()
+                return
+            now = time.monotonic()
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            last = now
+            if tokens < 1:
+                time.sleep((1 - tokens) / self.rate)
+                tokens, last = 1.0, time.monotonic()
+            tokens -= 1
+            try:
+                self.sender.send(row)
+                outcome = "sent"
+            except Exception as e:
+                outcome = "failed"
+                with self._lock:
+                    self.errors.append((row.get("id", ""), str(e)))
+                    self._ids.discard(row.get("id", ""))
+            with self._lock:
+                self.metrics[outcome] += 1
+            self._queue.task_done()
@@ -0,0 +1,83 @@
+import os
+import streamlit as st
+import firebase_admin
+from firebase_admin import credentials
+from instrumentation import InstrumentedBucket, InstrumentedClient
+from firebase_utils import DEFAULT_PROJECT, STORAGE_BUCKET, AssignmentFeed, TechnicianDirectory, VerifyPageCache
+from archive import ArchiveReader
+from sms import SendQueue, StubSender
+from repository import FirestoreRepository
+
+# --- Shared client resources ---
+# Each factory runs once per process; every rerun and session reuses the
+# result, so the Firebase app, the Firestore client (and the gRPC channel it
+# owns) and the bucket are built on the first page load only.
+
+class _EmulatorCredential(credentials.Base):
+    """Credential for the local emulators, which accept unauthenticated calls."""
+
+    def get_credential(self):
+        from google.auth.credentials import AnonymousCredentials
+        return AnonymousCredentials()
+
+
+@st.cache_resource
+def firebase_app():
+    if firebase_admin._apps:
+        return firebase_admin.get_app()
+    if os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        cred = _EmulatorCredential()
+    else:
+        cred = credentials.Certificate(dict(st.secrets["firebase"]))
+    return firebase_admin.initialize_app(cred, {
+        "storageBucket": STORAGE_BUCKET,
+        "projectId": os.environ.get("GOOGLE_CLOUD_PROJECT", DEFAULT_PROJECT),
+    })
+
+
+@st.cache_resource
+def firestore_client():
+    from firebase_admin import firestore
+    return InstrumentedClient(firestore.client(firebase_app()))
+
+
+@st.cache_resource
+def storage_bucket():
+    # google-cloud-storage is only needed for photo uploads, so import it on first use
+    from firebase_admin import storage
+    return InstrumentedBucket(storage.bucket(app=firebase_app()))
+
+
+@st.cache_resource
+def repository():
+    # technician/assignment/photo reads and writes; the bucket is built on first upload
+    return FirestoreRepository(firestore_client(), storage_bucket, archive_reader())
+
+
+@st.cache_resource
+def technician_directory():
+    # shared by every session in this process; writes go through the repository
+    return TechnicianDirectory(repository())
+
+
+@st.cache_resource
+def assignment_feed():
+    # one snapshot listener per viewed day, shared by every session
+    return AssignmentFeed(firestore_client())
+
+
+@st.cache_resource
+def verify_page_cache():
+    return VerifyPageCache(firestore_client(), technician_directory())
+
+
+@st.cache_resource
+def archive_reader():
+    # the bucket is only built when an archived month is actually read
+    return ArchiveReader(firestore_client(), storage_bucket)
+
+
+@st.cache_resource
+def send_queue():
+    # swap StubSender for a real SMS provider's sender to send for real
+    return SendQueue(StubSender(), rate=1.0)
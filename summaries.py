@@ -0,0 +1,158 @@
+import datetime
+from google.cloud.firestore_v1 import Increment, transactional
+from google.cloud.firestore_v1.base_query import FieldFilter
+from firebase_utils import CA_TZ, assignments_query, normalize_service_date
+from archive import is_archived
+
+# --- Daily dispatch summaries ---
+# One daily_summaries/{service_date} document per day:
+#   {"service_date", "jobs", "verified", "updated_at",
+#    "technicians": {badge_id: {"name", "jobs", "verified"}},
+#    "trucks": {truck_id: jobs}}
+# Every assignment write adds its counter changes to the same batch or
+# transaction, as Increment transforms, so concurrent edits never lose a count
+# and the Assign Job tab reads one document instead of the day's assignments.
+
+SUMMARIES = "daily_summaries"
+
+
+def summary_delta(before, after, out=None):
+    """Counter changes for one assignment going from `before` to `after`.
+
+    Either side may be None (insert / delete). Changes are added into `out`
+    and returned as {service_date: {path: value}}, where a path is a tuple such
+    as ("jobs",) or ("technicians", badge_id, "verified"); int values are
+    increments and str values (technician names) are set as is.
+    """
+    out = {} if out is None else out
+    for a, sign in ((before, -1), (after, 1)):
+        if not a or not a.get("service_date"):
+            continue
+        changes = out.setdefault(a["service_date"], {})
+        verified = sign if a.get("verified") else 0
+        badge = str(a.get("badge_id", "")) or "(none)"
+        paths = [(("jobs",), sign), (("verified",), verified),
+                 (("technicians", badge, "jobs"), sign), (("technicians", badge, "verified"), verified)]
+        if a.get("truck_id"):
+            paths.append((("trucks", str(a["truck_id"])), sign))
+        for path, n in paths:
+            changes[path] = changes.get(path, 0) + n
+        if sign > 0 and a.get("technician_name") and _who(before) != _who(after):
+            changes[("technicians", badge, "name")] = a["technician_name"]
+    return out
+
+
+def _who(a):
+    return a and (a.get("service_date"), a.get("badge_id"), a.get("technician_name"))
+
+
+def _nested(changes, increments=True):
+    data = {}
+    for path, value in changes.items():
+        node = data
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        node[path[-1]] = Increment(value) if increments and not isinstance(value, str) else value
+    return data
+
+
+def write_deltas(writer, db, deltas):
+    """Add summary_delta() changes to a WriteBatch or Transaction; dates whose counts
+    did not move are skipped. Returns the number of writes added."""
+    col = db.collection(SUMMARIES)
+    now = datetime.datetime.now(CA_TZ).isoformat()
+    writes = 0
+    for service_date, changes in deltas.items():
+        changes = {p: v for p, v in changes.items() if v}
+        if not changes:
+            continue
+        data = _nested(changes)
+        data.update({"service_date": service_date, "updated_at": now})
+        writer.set(col.document(service_date), data, merge=True)
+        writes += 1
+    return writes
+
+
+# --- Writes with summary upkeep ---
+def add_with_summary(db, data):
+    """Create an assignment and count it in one batch. Returns the new document ID."""
+    ref = db.collection("assignments").document()
+    batch = db.batch()
+    batch.set(ref, data)
+    write_deltas(batch, db, summary_delta(None, data))
+    batch.commit()
+    return ref.id
+
+
+def update_with_summary(db, doc_id, fields):
+    """Update an assignment and adjust the summaries it moves between, in a
+    transaction, so the counts match the document state it read."""
+    @transactional
+    def run(transaction):
+        ref = db.collection("assignments").document(doc_id)
+        snap = ref.get(transaction=transaction)
+        before = snap.to_dict() or {}
+        transaction.update(ref, fields)
+        write_deltas(transaction, db, summary_delta(before, {**before, **fields}))
+    run(db.transaction())
+
+
+def delete_with_summary(db, doc_id):
+    @transactional
+    def run(transaction):
+        ref = db.collection("assignments").document(doc_id)
+        snap = ref.get(transaction=transaction)
+        transaction.delete(ref)
+        if snap.exists:
+            write_deltas(transaction, db, summary_delta(snap.to_dict(), None))
+    run(db.transaction())
+
+
+# --- Reading and repair ---
+def load_summary(db, service_date):
+    snap = db.collection(SUMMARIES).document(normalize_service_date(service_date)).get()
+    return snap.to_dict() if snap.exists else None
+
+
+def summary_rows(summary):
+    """(per-technician rows, per-truck rows) for st.dataframe, busiest first."""
+    techs = [{"Technician": t.get("name", badge), "Badge ID": badge, "Jobs": t["jobs"],
+              "Verified": t.get("verified", 0), "Verified %": round(100 * t.get("verified", 0) / t["jobs"])}
+             for badge, t in (summary.get("technicians") or {}).items() if t.get("jobs", 0) > 0]
+    techs.sort(key=lambda r: (-r["Jobs"], r["Technician"]))
+    trucks = [{"Truck": truck, "Jobs": n} for truck, n in (summary.get("trucks") or {}).items() if n > 0]
+    trucks.sort(key=lambda r: (-r["Jobs"], r["Truck"]))
+    return techs, trucks
+
+
+def count_day(db, service_date):
+    """(jobs, verified) for a day from count() aggregation queries: two index
+    reads, however many assignments the day has."""
+    q = assignments_query(db, for_date=service_date)
+    jobs = q.count().get()[0][0].value
+    verified = q.where(filter=FieldFilter("verified", "==", True)).count().get()[0][0].value
+    return jobs, verified
+
+
+def rebuild_summary(db, service_date):
+    """Recount a day from its assignments and overwrite its summary, in a
+    transaction. For days written before summaries existed, or after edits
+    made outside the app. Only live assignments are counted, so days that
+    archive.py has moved to storage raise ValueError: their summary is the
+    only count left."""
+    service_date = normalize_service_date(service_date)
+    if is_archived(db, service_date):
+        raise ValueError(f"Jobs on {service_date} are archived; its summary is kept as their record")
+
+    @transactional
+    def run(transaction):
+        deltas = {}
+        for doc in assignments_query(db, for_date=service_date).get(transaction=transaction):
+            summary_delta(None, doc.to_dict(), deltas)
+        data = _nested(deltas.get(service_date, {}), increments=False)
+        data.setdefault("jobs", 0)
+        data.setdefault("verified", 0)
+        data.update({"service_date": service_date, "updated_at": datetime.datetime.now(CA_TZ).isoformat()})
+        transaction.set(db.collection(SUMMARIES).document(service_date), data)
+        return data
+    return run(db.transaction())
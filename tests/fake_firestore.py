@@ -0,0 +1,162 @@
+"""Just enough of the Firestore client API, over plain dicts, for the modules
+that take a `db`: filtered and ordered queries with cursors, batches,
+count() aggregations and snapshot listeners that deliver the initial results.
+FakeBucket does the same for the Cloud Storage blob calls archive.py makes."""
+import types
+import uuid
+
+_OPS = {
+    "==": lambda a, b: a == b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "in": lambda a, b: a in b,
+}
+
+
+class Snapshot:
+    def __init__(self, ref, data):
+        self.reference = ref
+        self.id = ref.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return self._data.get(field)
+
+
+class DocumentRef:
+    def __init__(self, collection, doc_id):
+        self.collection = collection
+        self.id = doc_id
+
+    def get(self, transaction=None):
+        self.collection.db.reads += 1
+        return Snapshot(self, self.collection.docs.get(self.id))
+
+    def set(self, data, merge=False):
+        self.collection.docs[self.id] = {**self.collection.docs.get(self.id, {}), **data} if merge else dict(data)
+
+    def update(self, fields):
+        self.collection.docs[self.id].update(fields)
+
+    def delete(self):
+        self.collection.docs.pop(self.id, None)
+
+
+class Query:
+    def __init__(self, collection, filters=(), orders=(), limit=None, after=None):
+        self.collection = collection
+        self._filters, self._orders, self._limit, self._after = list(filters), list(orders), limit, after
+
+    def _with(self, **changes):
+        args = {"filters": self._filters, "orders": self._orders, "limit": self._limit, "after": self._after, **changes}
+        return Query(self.collection, **args)
+
+    def where(self, filter):
+        return self._with(filters=self._filters + [(filter.field_path, filter.op_string, filter.value)])
+
+    def order_by(self, field):
+        return self._with(orders=self._orders + [field])
+
+    def limit(self, n):
+        return self._with(limit=n)
+
+    def start_after(self, snapshot):
+        return self._with(after=snapshot)
+
+    def _key(self, doc_id, data):
+        return [doc_id if f == "__name__" else data.get(f) for f in self._orders] + [doc_id]
+
+    def _matches(self):
+        rows = [(i, d) for i, d in self.collection.docs.items() if all(_OPS[op](d.get(f), v) for f, op, v in self._filters)]
+        rows.sort(key=lambda r: self._key(*r))
+        if self._after is not None:
+            after = self._key(self._after.id, self._after._data)
+            rows = [r for r in rows if self._key(*r) > after]
+        return rows[:self._limit] if self._limit is not None else rows
+
+    def stream(self, transaction=None):
+        rows = self._matches()
+        self.collection.db.reads += max(len(rows), 1)
+        return iter([Snapshot(DocumentRef(self.collection, i), dict(d)) for i, d in rows])
+
+    def get(self, transaction=None):
+        return list(self.stream())
+
+    def count(self):
+        n = len(self._matches())
+        return types.SimpleNamespace(get=lambda: [[types.SimpleNamespace(value=n)]])
+
+    def on_snapshot(self, callback):
+        docs = list(self.stream())
+        added = types.SimpleNamespace(name="ADDED")
+        callback(docs, [types.SimpleNamespace(type=added, document=d) for d in docs], None)
+        watch = types.SimpleNamespace(is_active=True)
+        watch.unsubscribe = lambda: setattr(watch, "is_active", False)
+        self.collection.db.watches.append(watch)
+        return watch
+
+
+class Collection(Query):
+    def __init__(self, db, name):
+        super().__init__(self)
+        self.db = db
+        self.name = name
+        self.docs = {}
+
+    def document(self, doc_id=None):
+        return DocumentRef(self, doc_id or uuid.uuid4().hex[:20])
+
+
+class Batch:
+    def __init__(self):
+        self._ops = []
+
+    def set(self, ref, data, merge=False):
+        self._ops.append(lambda: ref.set(data, merge))
+
+    def update(self, ref, fields):
+        self._ops.append(lambda: ref.update(fields))
+
+    def delete(self, ref):
+        self._ops.append(ref.delete)
+
+    def commit(self):
+        for op in self._ops:
+            op()
+
+
+class FakeFirestore:
+    def __init__(self):
+        self.collections = {}
+        self.watches = []
+        self.reads = 0
+
+    def collection(self, name):
+        if name not in self.collections:
+            self.collections[name] = Collection(self, name)
+        return self.collections[name]
+
+    def batch(self):
+        return Batch()
+
+
+
+class FakeBucket:
+    """Cloud Storage bucket holding blobs as bytes."""
+
+    def __init__(self):
+        self.blobs = {}
+
+    def blob(self, name):
+        bucket = self
+        return types.SimpleNamespace(
+            exists=lambda: name in bucket.blobs,
+            download_as_bytes=lambda: bucket.blobs[name],
+            upload_from_string=lambda data, content_type=None: bucket.blobs.__setitem__(name, data),
+        )
@@ -0,0 +1,82 @@
+import datetime
+import pytest
+from fake_firestore import FakeBucket, FakeFirestore
+from archive import ArchiveReader, archive_assignments, blob_name, is_archived, read_month
+from summaries import rebuild_summary
+
+TODAY = datetime.date(2026, 7, 1)
+
+
+def seeded(dates):
+    db = FakeFirestore()
+    jobs = db.collection("assignments")
+    for i, service_date in enumerate(dates):
+        jobs.document(f"a{i:03d}").set({"service_date": service_date, "badge_id": f"T{i % 3}",
+                                        "scheduled_time": f"{8 + i % 9:02d}:00"})
+    return db
+
+
+def test_moves_old_jobs_into_monthly_blobs():
+    db = seeded(["2026-02-27", "2026-02-28", "2026-03-01", "2026-03-02", "2026-06-30"])
+    bucket = FakeBucket()
+    assert archive_assignments(db, bucket, days=90, today=TODAY, page_size=2) == {"2026-02": 2, "2026-03": 2}
+    assert list(db.collection("assignments").docs) == ["a004"]
+    assert sorted(read_month(bucket, "2026-03")) == ["a002", "a003"]
+    index = db.collection("archive_index").docs["2026-02"]
+    assert (index["blob"], index["count"], index["dates"]) == (blob_name("2026-02"), 2, ["2026-02-27", "2026-02-28"])
+    assert is_archived(db, "2026-03-01") and not is_archived(db, "2026-03-03")
+
+
+def test_dry_run_moves_nothing():
+    db = seeded(["2026-02-27", "2026-03-01"])
+    bucket = FakeBucket()
+    assert archive_assignments(db, bucket, days=90, today=TODAY, dry_run=True) == {"2026-02": 1, "2026-03": 1}
+    assert len(db.collection("assignments").docs) == 2 and not bucket.blobs
+
+
+def test_rerun_merges_into_the_existing_month():
+    db = seeded(["2026-03-01", "2026-03-20"])
+    bucket = FakeBucket()
+    archive_assignments(db, bucket, days=90, today=datetime.date(2026, 6, 5))
+    archive_assignments(db, bucket, days=90, today=TODAY)
+    assert sorted(read_month(bucket, "2026-03")) == ["a000", "a001"]
+    assert db.collection("archive_index").docs["2026-03"]["count"] == 2
+
+
+def test_blank_and_malformed_dates_stay_live():
+    db = seeded(["", "03/01/2026", "2026-03-01"])
+    bucket = FakeBucket()
+    assert archive_assignments(db, bucket, days=90, today=TODAY) == {"2026-03": 1}
+    assert sorted(db.collection("assignments").docs) == ["a000", "a001"]
+    assert list(db.collection("archive_index").docs) == ["2026-03"]
+
+
+def test_reader_finds_archived_jobs_by_date_and_badge():
+    db = seeded(["2026-03-01", "2026-03-01", "2026-03-01", "2026-03-02"])
+    bucket = FakeBucket()
+    archive_assignments(db, bucket, days=90, today=TODAY)
+    reader = ArchiveReader(db, lambda: bucket)
+    jobs = reader.find("2026-03-01")
+    assert [j["_id"] for j in jobs] == ["a000", "a001", "a002"]
+    assert [j["_id"] for j in reader.find("2026-03-01", "T1")] == ["a001"]
+    assert reader.find("2026-03-01", "T9") == [] and reader.find("2026-04-01") == []
+    assert [r["id"] for r in reader.iter_range("2026-03-02", "2026-03-31")] == ["a003"]
+    assert reader.count_range("2026-03-02", "2026-03-31") == 4  # the whole month, an upper bound
+
+
+def test_reader_does_not_download_a_cached_month_again():
+    db = seeded(["2026-03-01"])
+    bucket = FakeBucket()
+    archive_assignments(db, bucket, days=90, today=TODAY)
+    downloads = []
+    reader = ArchiveReader(db, lambda: downloads.append(1) or bucket)
+    reader.find("2026-03-01")
+    reader.find("2026-03-01", "T0")
+    assert len(downloads) == 1
+
+
+def test_rebuild_refuses_archived_days():
+    db = seeded(["2026-03-01"])
+    archive_assignments(db, FakeBucket(), days=90, today=TODAY)
+    with pytest.raises(ValueError):
+        rebuild_summary(db, "2026-03-01")
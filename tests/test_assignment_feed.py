@@ -0,0 +1,85 @@
+import time
+from fake_firestore import FakeFirestore
+from firebase_utils import AssignmentFeed
+
+
+def feed_with_jobs(**kwargs):
+    db = FakeFirestore()
+    jobs = db.collection("assignments")
+    jobs.document("a1").set({"service_date": "2026-03-02", "badge_id": "T1", "scheduled_time": "09:00"})
+    jobs.document("a2").set({"service_date": "2026-03-02", "badge_id": "T2", "scheduled_time": "10:00"})
+    jobs.document("b1").set({"service_date": "2026-03-03", "badge_id": "T1", "scheduled_time": "08:00"})
+    return db, AssignmentFeed(db, sweep_interval=None, **kwargs)
+
+
+def ids(rows):
+    return sorted(a["_id"] for a in rows)
+
+
+def test_day_is_served_from_memory_after_the_first_list():
+    db, feed = feed_with_jobs()
+    assert ids(feed.list("2026-03-02")) == ["a1", "a2"]
+    reads = db.reads
+    assert ids(feed.list("2026-03-02", badge_id="T2")) == ["a2"]
+    assert db.reads == reads
+    assert feed.metrics["listeners_opened"] == 1
+
+
+def test_note_write_updates_and_moves_cached_jobs():
+    _, feed = feed_with_jobs()
+    feed.list("2026-03-02")
+    feed.list("2026-03-03")
+    feed.note_write("a1", {"verified": True})
+    assert next(a for a in feed.list("2026-03-02") if a["_id"] == "a1")["verified"] is True
+
+    feed.note_write("a2", {"service_date": "2026-03-03"})
+    assert ids(feed.list("2026-03-02")) == ["a1"]
+    moved = next(a for a in feed.list("2026-03-03") if a["_id"] == "a2")
+    assert (moved["badge_id"], moved["scheduled_time"]) == ("T2", "10:00")
+
+    feed.note_write("new", {"service_date": "2026-03-03", "badge_id": "T3"})
+    assert ids(feed.list("2026-03-03")) == ["a2", "b1", "new"]
+
+
+def test_note_write_for_an_unviewed_day_is_ignored():
+    _, feed = feed_with_jobs()
+    feed.list("2026-03-02")
+    feed.note_write("a1", {"service_date": "2026-03-09"})
+    assert ids(feed.list("2026-03-02")) == ["a2"]
+    assert feed.metrics["listeners_opened"] == 1
+
+
+def test_note_delete_removes_the_job():
+    _, feed = feed_with_jobs()
+    feed.list("2026-03-02")
+    feed.note_delete("a1")
+    assert ids(feed.list("2026-03-02")) == ["a2"]
+
+
+def test_sweep_closes_idle_listeners_without_a_list_call():
+    db, feed = feed_with_jobs(idle_ttl=0.05)
+    feed.list("2026-03-02")
+    feed.list("2026-03-03")
+    assert feed.sweep() == 0
+    time.sleep(0.1)
+    assert feed.sweep() == 2
+    assert not any(w.is_active for w in db.watches)
+    assert feed.metrics["listeners_evicted"] == 2
+
+
+def test_background_sweep_runs_on_its_own():
+    db = FakeFirestore()
+    feed = AssignmentFeed(db, idle_ttl=0.01, sweep_interval=0.02)
+    feed.list("2026-03-02")
+    deadline = time.monotonic() + 2
+    while db.watches[0].is_active and time.monotonic() < deadline:
+        time.sleep(0.01)
+    feed.close()
+    assert not db.watches[0].is_active
+
+
+def test_only_the_most_recent_days_keep_listeners():
+    db, feed = feed_with_jobs(max_days=1)
+    feed.list("2026-03-02")
+    feed.list("2026-03-03")
+    assert [w.is_active for w in db.watches] == [False, True]
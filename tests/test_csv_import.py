@@ -0,0 +1,161 @@
+import datetime
+import pytest
+import csv_import
+from csv_import import apply_import, import_key, import_rows, plan_import, validate_frame
+from repository import MemoryRepository
+
+pd = pytest.importorskip("pandas")
+
+DAY = datetime.date(2026, 3, 2)
+
+
+def frame(rows):
+    """A raw CSV frame from (badge, project, scheduled time) tuples."""
+    return pd.DataFrame({
+        "Technician Name": [f"Tech {b}" for b, _, _ in rows],
+        "Badge ID": [b for b, _, _ in rows],
+        "Project ID": [p for _, p, _ in rows],
+        "Customer Name": "Kim Lee",
+        "Address": "123 Main St",
+        "Scheduled Time": [t for _, _, t in rows],
+        "Truck ID": "K1",
+    })
+
+
+def clean_frame(rows):
+    clean, report = validate_frame(frame(rows), DAY)
+    assert not len(report)
+    return clean
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(csv_import, "CHUNK_ROWS", 2)
+
+
+# --- validate_frame ---
+def test_validate_normalizes_dates_and_optional_columns():
+    clean, report = validate_frame(frame([("T1", "P1", "09:30"), ("T2", "P2", "2026-03-05 14:00")]), DAY)
+    assert not len(report)
+    assert list(clean["service_date"]) == ["2026-03-02", "2026-03-05"]
+    assert list(clean["scheduled_time"]) == ["09:30", "14:00"]
+    assert list(clean["photo_url"]) == ["", ""] and list(clean["customer_phone"]) == ["", ""]
+    assert str(clean["scheduled_at"].iloc[0]) == "2026-03-02 09:30:00-08:00"
+
+
+def test_validate_reports_missing_columns():
+    clean, report = validate_frame(frame([("T1", "P1", "09:00")]).drop(columns=["Truck ID"]), DAY)
+    assert clean.empty
+    assert report[["column", "severity", "message"]].values.tolist() == [["Truck ID", "error", "Missing column"]]
+
+
+def test_validate_flags_bad_rows_by_csv_row_number():
+    clean, report = validate_frame(frame([("T1", "P1", "09:00"), ("", "P2", "10:00"), ("T3", "P3", "9am")]), DAY)
+    assert list(clean["badge_id"]) == ["T1"]
+    errors = report[report["severity"] == "error"]
+    assert errors[["row", "column"]].values.tolist() == [[3, "Badge ID"], [4, "Scheduled Time"]]
+
+
+def test_validate_skips_duplicate_rows():
+    clean, report = validate_frame(frame([("T1", "P1", "09:00"), ("T2", "P2", "10:00"), ("T1", "P1", "09:00")]), DAY)
+    assert list(clean["project_id"]) == ["P1", "P2"]
+    assert report[["row", "severity", "message"]].values.tolist() == [[4, "warning", "Duplicate of row 2, skipped"]]
+
+
+def test_validate_reads_repeated_dst_hour_as_standard_time():
+    clean, report = validate_frame(frame([("T1", "P1", "2026-11-01 01:30"), ("T2", "P2", "2026-11-01 02:30")]), DAY)
+    assert len(clean) == 2
+    assert report[["row", "severity"]].values.tolist() == [[2, "warning"]]
+    assert str(clean["scheduled_at"].iloc[0]) == "2026-11-01 01:30:00-08:00"
+
+
+def test_validate_rejects_times_skipped_when_dst_starts():
+    clean, report = validate_frame(frame([("T1", "P1", "2026-03-08 02:30"), ("T2", "P2", "2026-03-08 03:30")]), DAY)
+    assert list(clean["badge_id"]) == ["T2"]
+    assert report[["row", "column", "severity"]].values.tolist() == [[2, "Scheduled Time", "error"]]
+    assert str(clean["scheduled_at"].iloc[0]) == "2026-03-08 03:30:00-07:00"
+
+
+# --- plan_import / apply_import ---
+def test_dry_run_counts_and_writes_nothing():
+    repo = MemoryRepository()
+    plan = plan_import(repo, clean_frame([("T1", "P1", "09:00"), ("T1", "P2", "10:00"), ("T2", "P3", "11:00")]))
+    assert plan["counts"] == {"insert": 3, "update": 0, "noop": 0}
+    assert (plan["added_techs"], plan["updated_techs"]) == (2, 0)
+    assert not repo.assignments and not repo.technicians and not repo.summaries
+
+
+def test_reimport_is_noop_and_changes_only_touch_changed_fields():
+    repo = MemoryRepository()
+    rows = [("T1", "P1", "09:00"), ("T2", "P2", "10:00")]
+    assert import_rows(repo, clean_frame(rows)) == (2, 0, 2)
+    doc_id = next(iter(repo.assignments))
+    repo.update_assignment(doc_id, {"verified": True})
+
+    assert plan_import(repo, clean_frame(rows))["counts"] == {"insert": 0, "update": 0, "noop": 2}
+
+    df = frame(rows)
+    df["Address"] = ["9 New Rd", "123 Main St"]
+    df["Technician Name"] = ["Tech T1", "Renamed"]
+    plan = plan_import(repo, validate_frame(df, DAY)[0])
+    assert plan["counts"] == {"insert": 0, "update": 2, "noop": 0}
+    assert plan["updated_techs"] == 1
+    assert [payload for _, _, payload in plan["chunks"][0]] == [{"address": "9 New Rd"}, {"technician_name": "Renamed"}]
+    apply_import(repo, plan)
+    assert repo.assignments[doc_id]["verified"] is True
+    assert repo.technicians["T2"]["name"] == "Renamed"
+    summary = repo.load_summary(DAY)
+    assert (summary["jobs"], summary["verified"]) == (2, 1)
+    assert summary["technicians"]["T2"]["name"] == "Renamed"
+
+
+def test_duplicate_keys_across_chunks_insert_once(small_chunks):
+    repo = MemoryRepository()
+    df = frame([("T1", "P1", "09:00"), ("T2", "P2", "10:00"), ("T1", "P1", "09:00")])
+    df.loc[2, "Address"] = "9 New Rd"  # same job key, different row, so validation keeps it
+    clean, _ = validate_frame(df, DAY)
+    plan = plan_import(repo, clean)
+    assert plan["counts"] == {"insert": 2, "update": 1, "noop": 0}
+    apply_import(repo, plan)
+    assert len(repo.assignments) == 2
+    assert repo.load_summary(DAY)["jobs"] == 2
+    assert sorted(a["address"] for a in repo.assignments.values()) == ["123 Main St", "9 New Rd"]
+
+
+class FailingRepository(MemoryRepository):
+    """Raises on the write of chunk `fail_at`, like a dropped connection."""
+
+    def __init__(self, fail_at):
+        super().__init__()
+        self.fail_at = fail_at
+
+    def write_assignments(self, ops, deltas=None, checkpoint=None):
+        if checkpoint is not None and checkpoint[1] == self.fail_at:
+            self.fail_at = None
+            raise ConnectionError("connection reset")
+        super().write_assignments(ops, deltas, checkpoint)
+
+
+def test_interrupted_import_resumes_from_checkpoint(small_chunks):
+    repo = FailingRepository(fail_at=1)
+    clean = clean_frame([("T1", f"P{i}", f"{8 + i:02d}:00") for i in range(5)])
+    key = import_key(clean)
+    with pytest.raises(ConnectionError):
+        apply_import(repo, plan_import(repo, clean), key)
+    assert repo.load_checkpoint(key) == {0}
+    assert len(repo.assignments) == 2
+
+    done = repo.load_checkpoint(key)
+    plan = plan_import(repo, clean, done)
+    assert plan["chunks"][0] is None
+    assert plan["counts"] == {"insert": 3, "update": 0, "noop": 0}
+    apply_import(repo, plan, key)
+    assert repo.load_checkpoint(key) == {0, 1, 2}
+    assert len(repo.assignments) == 5
+    assert repo.load_summary(DAY)["jobs"] == 5
+
+
+def test_import_key_is_stable_per_file():
+    rows = [("T1", "P1", "09:00"), ("T2", "P2", "10:00")]
+    assert import_key(clean_frame(rows)) == import_key(clean_frame(rows))
+    assert import_key(clean_frame(rows)) != import_key(clean_frame(rows[:1]))
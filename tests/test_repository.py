@@ -0,0 +1,56 @@
+import pytest
+from fake_firestore import FakeFirestore
+from csv_export import export_assignments
+from repository import FirestoreRepository, MemoryRepository
+
+
+def seeded(backend):
+    repo = MemoryRepository() if backend == "memory" else FirestoreRepository(FakeFirestore())
+    repo.write_technicians({f"T{i:02d}": {"name": f"Tech {25 - i:02d}", "badge_id": f"T{i:02d}"} for i in range(25)}, {})
+    repo.write_assignments([(f"A{i:03d}", "insert", {"badge_id": f"T{i % 5:02d}", "service_date": f"2026-03-{1 + i % 10:02d}",
+                                                     "scheduled_time": "09:00", "verified": i % 4 == 0})
+                            for i in range(60)])
+    return repo
+
+
+@pytest.fixture(params=["memory", "firestore"])
+def repo(request):
+    return seeded(request.param)
+
+
+def all_pages(repo, *args):
+    pages, cursor = [], None
+    while True:
+        page, cursor = repo.page_technicians(*args, start_after=cursor)
+        pages.append([t["id"] for t in page])
+        if cursor is None:
+            return pages
+
+
+def test_page_technicians_walks_every_page_in_order(repo):
+    pages = all_pages(repo, "badge_id", "", 10)
+    assert [len(p) for p in pages] == [10, 10, 5]
+    assert sum(pages, []) == [f"T{i:02d}" for i in range(25)]
+    assert all_pages(repo, "name", "Tech 0", 4) == [["T24", "T23", "T22", "T21"], ["T20", "T19", "T18", "T17"], ["T16"]]
+
+
+def test_export_and_count_cover_the_same_rows(repo):
+    out, count = export_assignments(repo, "2026-03-02", "2026-03-04", badge_ids=["T01", "T02"])
+    with out:
+        lines = out.read().decode("utf-8").splitlines()
+    assert count == len(lines) - 1 == 12
+    assert repo.count_assignments("2026-03-02", "2026-03-04", ["T01", "T02"]) == count
+    assert repo.count_assignments("2026-03-01", "2026-03-10") == 60
+
+
+def test_count_day(repo):
+    assert repo.count_day("2026-03-01") == (6, 3)
+
+
+def test_memory_rebuild_summary_recounts_the_day():
+    repo = seeded("memory")
+    assert repo.load_summary("2026-03-01") is None  # write_assignments without deltas counts nothing
+    summary = repo.rebuild_summary("2026-03-01")
+    assert (summary["jobs"], summary["verified"]) == repo.count_day("2026-03-01")
+    assert summary["technicians"]["T00"] == {"jobs": 6, "verified": 3}
+    assert repo.rebuild_summary("2026-04-01")["jobs"] == 0
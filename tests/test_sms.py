@@ -0,0 +1,97 @@
+import time
+import threading
+from sms import SendQueue, StubSender, dispatch_sheet, render_message, sheet_csv, sheet_txt, verify_url
+
+
+def job(doc_id, badge, name, at, phone="+15550100"):
+    return {"_id": doc_id, "badge_id": badge, "technician_name": name, "scheduled_time": at, "service_date": "2026-03-02",
+            "customer_name": "Kim", "customer_phone": phone, "project_id": "P1", "address": "1 Main St", "truck_id": "K1"}
+
+
+def test_dispatch_sheet_groups_by_technician_in_time_order():
+    rows = dispatch_sheet([job("a", "T2", "Bo", "11:00"), job("b", "T1", "Ann", "14:00"), job("c", "T2", "Bo", "08:30"),
+                           job("d", "T1", "Ann", "09:00")])
+    assert [r["id"] for r in rows] == ["d", "b", "c", "a"]
+    assert rows[0]["customer_phone"] == "+15550100"
+    assert rows[0]["message"] == render_message(job("d", "T1", "Ann", "09:00"))
+    assert "09:00 AM" in rows[0]["message"] and verify_url("T1") in rows[0]["message"]
+
+
+def test_sheet_formats():
+    rows = dispatch_sheet([job("a", "T1", "Ann", "09:00"), job("b", "T1", "Ann", "10:00"), job("c", "T2", "Bo", "08:00")])
+    assert sheet_csv(rows).decode("utf-8").splitlines()[0].split(",")[:6] == [
+        "technician_name", "badge_id", "service_date", "scheduled_time", "customer_name", "customer_phone"]
+    txt = sheet_txt(rows).decode("utf-8")
+    assert txt.count("==== ") == 2 and "==== Ann (T1) · 2 job(s) ====" in txt
+
+
+class FlakySender(StubSender):
+    def __init__(self, fail_ids):
+        super().__init__()
+        self.fail_ids = set(fail_ids)
+
+    def send(self, row):
+        if row["id"] in self.fail_ids:
+            raise RuntimeError("provider down")
+        super().send(row)
+
+
+def test_put_skips_rows_already_queued_or_sent():
+    sender = StubSender()
+    queue = SendQueue(sender, rate=1000, burst=100)
+    rows = dispatch_sheet([job("a", "T1", "Ann", "09:00"), job("b", "T1", "Ann", "10:00")])
+    assert queue.put(rows) == 2
+    assert queue.put(rows) == 0
+    assert queue.drain(timeout=5)
+    assert queue.put(rows) == 0
+    assert [m["id"] for m in sender.sent] == ["a", "b"]
+    assert queue.metrics == {"queued": 2, "sent": 2, "failed": 0}
+    queue.close()
+
+
+def test_put_skips_rows_without_a_phone():
+    sender = StubSender()
+    queue = SendQueue(sender, rate=1000, burst=100)
+    rows = dispatch_sheet([job("a", "T1", "Ann", "09:00", phone=""), job("b", "T1", "Ann", "10:00", phone=" "),
+                           job("c", "T1", "Ann", "11:00")])
+    assert queue.put(rows) == 1
+    assert queue.drain(timeout=5)
+    assert [m["to"] for m in sender.sent] == ["+15550100"]
+    queue.close()
+
+
+def test_failed_rows_are_recorded_and_can_be_put_again():
+    sender = FlakySender({"b"})
+    queue = SendQueue(sender, rate=1000, burst=100)
+    rows = dispatch_sheet([job("a", "T1", "Ann", "09:00"), job("b", "T1", "Ann", "10:00")])
+    queue.put(rows)
+    assert queue.drain(timeout=5)
+    assert queue.errors == [("b", "provider down")]
+    sender.fail_ids.clear()
+    assert queue.put(rows) == 1
+    assert queue.drain(timeout=5)
+    assert sorted(m["id"] for m in sender.sent) == ["a", "b"]
+    assert queue.metrics == {"queued": 3, "sent": 2, "failed": 1}
+    queue.close()
+
+
+class ClockSender:
+    def __init__(self):
+        self.times = []
+        self._lock = threading.Lock()
+
+    def send(self, row):
+        with self._lock:
+            self.times.append(time.monotonic())
+
+
+def test_rate_limit_allows_a_burst_then_spaces_messages():
+    sender = ClockSender()
+    queue = SendQueue(sender, rate=20, burst=3)
+    queue.put([{"id": str(i), "customer_phone": "+1555", "message": ""} for i in range(7)])
+    assert queue.drain(timeout=5)
+    queue.close()
+    gaps = [b - a for a, b in zip(sender.times, sender.times[1:])]
+    assert sum(gaps[:2]) < 0.04  # the burst goes out at once
+    assert min(gaps[3:]) > 0.04  # then one every 1/20 s
+    assert sender.times[-1] - sender.times[0] >= 4 / 20 - 0.01
@@ -0,0 +1,54 @@
+from repository import MemoryRepository
+from summaries import summary_delta
+
+
+def job(**fields):
+    return {"badge_id": "T1", "technician_name": "Ann", "service_date": "2026-03-02", "truck_id": "K1",
+            "verified": False, **fields}
+
+
+def nonzero(deltas):
+    return {d: {p: v for p, v in changes.items() if v and not isinstance(v, str)} for d, changes in deltas.items()}
+
+
+def test_insert_counts_job_technician_and_truck():
+    deltas = summary_delta(None, job(verified=True))
+    assert deltas == {"2026-03-02": {
+        ("jobs",): 1, ("verified",): 1, ("technicians", "T1", "jobs"): 1, ("technicians", "T1", "verified"): 1,
+        ("trucks", "K1"): 1, ("technicians", "T1", "name"): "Ann"}}
+
+
+def test_insert_then_delete_cancels_out():
+    deltas = summary_delta(None, job(verified=True))
+    summary_delta(job(verified=True), None, deltas)
+    assert nonzero(deltas) == {"2026-03-02": {}}
+
+
+def test_unchanged_update_is_empty():
+    assert nonzero(summary_delta(job(), job(customer_name="Kim"))) == {"2026-03-02": {}}
+
+
+def test_moving_a_job_between_dates_and_badges():
+    deltas = summary_delta(job(), job(service_date="2026-03-03", badge_id="T2", technician_name="Bo", truck_id=""))
+    assert nonzero(deltas) == {
+        "2026-03-02": {("jobs",): -1, ("technicians", "T1", "jobs"): -1, ("trucks", "K1"): -1},
+        "2026-03-03": {("jobs",): 1, ("technicians", "T2", "jobs"): 1},
+    }
+    assert deltas["2026-03-03"][("technicians", "T2", "name")] == "Bo"
+
+
+def test_repository_summary_round_trip():
+    repo = MemoryRepository()
+    first = repo.add_assignment(job())
+    second = repo.add_assignment(job(badge_id="T2", technician_name="Bo"))
+    repo.update_assignment(first, {"verified": True})
+    summary = repo.load_summary("2026-03-02")
+    assert (summary["jobs"], summary["verified"]) == (2, 1)
+    assert summary["technicians"]["T1"] == {"name": "Ann", "jobs": 1, "verified": 1}
+    assert summary["trucks"] == {"K1": 2}
+
+    repo.update_assignment(second, {"service_date": "2026-03-03"})
+    repo.delete_assignment(first)
+    summary = repo.load_summary("2026-03-02")
+    assert (summary["jobs"], summary["verified"], summary["trucks"]["K1"]) == (0, 0, 0)
+    assert repo.load_summary("2026-03-03")["jobs"] == 1
@@ -0,0 +1,24 @@
+from firebase_utils import TechnicianDirectory
+from repository import MemoryRepository
+
+
+def test_writes_go_through_the_repository():
+    repo = MemoryRepository()
+    techs = TechnicianDirectory(repo)
+    techs.set(" T1 ", {"name": "Ann", "badge_id": "T1"})
+    techs.update("T1", {"name": "Anne"})
+    assert repo.technicians == {"T1": {"name": "Anne", "badge_id": "T1"}}
+    assert techs.get("T1") == {"id": "T1", "name": "Anne", "badge_id": "T1"}
+    techs.delete("T1")
+    assert repo.technicians == {} and techs.get("T1") is None
+
+
+def test_invalidate_picks_up_direct_repository_writes():
+    repo = MemoryRepository()
+    techs = TechnicianDirectory(repo)
+    assert techs.get("T2") is None
+    repo.write_technicians({"T2": {"name": "Bo", "badge_id": "T2"}}, {})
+    assert techs.get("T2") is None  # the miss is cached
+    techs.invalidate(["T2"])
+    assert techs.get("T2")["name"] == "Bo"
+    assert [t["id"] for t in techs.list()] == ["T2"]